@@ -1,23 +1,39 @@
-from typing import Annotated
+import time
+from typing import Annotated, Any
 
 import jwt
 from fastapi import Depends, HTTPException, Header
 from jwt import InvalidTokenError
 from pydantic import ValidationError
+from sqlalchemy.orm import make_transient_to_detached
 from starlette import status
 
 from api.dependencies.session import SessionDep
-from core import security
+from core import metrics, security
+from core.cache import TTLCache
 from core.settings import settings
 from models.tables.user import User
 from models.token import TokenPayload
 
-async def get_current_user(session: SessionDep, authorization: Annotated[str | None, Header()] = None) -> User:
-    # Extract Bearer token
-    if authorization is None or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
+# token -> verified payload, kept until the token expires (bounded by TOKEN_CACHE_TTL)
+token_cache: TTLCache[str, TokenPayload] = TTLCache(maxsize=settings.TOKEN_CACHE_SIZE, ttl=settings.TOKEN_CACHE_TTL)
+# user id -> column values of the user row
+user_cache: TTLCache[str, dict[str, Any]] = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+metrics.register_cache("token", token_cache)
+metrics.register_cache("user", user_cache)
 
-    token = authorization.split(" ")[1]  # Extract the token after 'Bearer'
+
+def invalidate_user(user_id: Any) -> None:
+    """
+    Must be called once a change to a user row is committed (e.g. avatar update).
+    """
+    user_cache.invalidate(str(user_id))
+
+
+def _verify_token(token: str) -> TokenPayload:
+    token_data = token_cache.get(token)
+    if token_data is not None:
+        return token_data
 
     try:
         payload = jwt.decode(
@@ -35,9 +51,33 @@ async def get_current_user(session: SessionDep, authorization: Annotated[str | N
             detail="Something went wrong while trying to validate the token"
         )
 
-    user: User | None = session.get(User, token_data.sub)
+    # never serve a cached token past its expiration
+    if "exp" in payload:
+        token_cache.set(token, token_data, ttl=payload["exp"] - time.time())
+    return token_data
+
+
+async def get_current_user(session: SessionDep, authorization: Annotated[str | None, Header()] = None) -> User:
+    # Extract Bearer token
+    if authorization is None or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
+
+    token = authorization.split(" ")[1]  # Extract the token after 'Bearer'
+
+    token_data = _verify_token(token)
+
+    cached = user_cache.get(token_data.sub)
+    if cached is not None:
+        # a fresh detached instance per request: it can be attached to this request's session if modified
+        user = User(**cached)
+        make_transient_to_detached(user)
+        return user
+
+    user: User | None = await session.get(User, token_data.sub)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+
+    user_cache.set(token_data.sub, user.model_dump())
     return user
 
-CurrentUserDep = Annotated[User, Depends(get_current_user)]
\ No newline at end of file
+CurrentUserDep = Annotated[User, Depends(get_current_user)]
@@ -1,50 +1,61 @@
 import uuid
 
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response
 from starlette import status
 
 from api.dependencies.current_user import CurrentUserDep
 from api.dependencies.logger import LoggerDep
 from api.dependencies.session import SessionDep
-from api.utils.minio import stream_resource
-from core.minio import minio_client
+from api.utils.follow_graph import is_approved_follower
+from api.utils.minio import serve_resource
+from api.utils.variants import ImageVariant, resolve_width
+from core.storage import storage
 from models.tables.asset import Asset, AssetVisibility
-from models.tables.follower import Follower, FollowStatus
 
 router = APIRouter(prefix="/assets", tags=["assets"])
 
 @router.get("/{asset_id}")
 async def get_image(
     asset_id: uuid.UUID,
+    request: Request,
     current_user: CurrentUserDep,
     session: SessionDep,
     logger: LoggerDep,
-) -> StreamingResponse:
-    asset = session.get(Asset, asset_id)
+    w: int | None = Query(default=None, gt=0, description="Serve a resized variant at least this wide"),
+    variant: ImageVariant | None = None,
+) -> Response:
+    width = resolve_width(w, variant)
+
+    asset = await session.get(Asset, asset_id)
     if asset is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Asset not found")
 
     # if the asset is public - let's shortcut and stream
     if asset.asset_visibility == AssetVisibility.PUBLIC:
-        return stream_resource(
-            minio_client=minio_client,
+        return await serve_resource(
+            storage=storage,
             asset=asset,
+            request=request,
+            width=width,
         )
 
     # if the current user is the asset's author - let's shortcut and stream
     if asset.author == current_user.id:
-        return stream_resource(
-            minio_client=minio_client,
+        return await serve_resource(
+            storage=storage,
             asset=asset,
+            request=request,
+            width=width,
         )
 
     # if the current user is an approved follower of asset#author
-    follow = session.get(Follower, (current_user.id, asset.author))
-    if follow is not None and follow.status == FollowStatus.APPROVED:
-        return stream_resource(
-            minio_client=minio_client,
+    if await is_approved_follower(current_user.id, asset.author, session):
+        return await serve_resource(
+            storage=storage,
             asset=asset,
+            request=request,
+            width=width,
         )
 
     err = f"asset {asset_id} is private. current user {current_user.id} is not an approved follower of {asset.author}."
@@ -1,16 +1,18 @@
 import uuid
 
-from fastapi import APIRouter, HTTPException, UploadFile
+from fastapi import APIRouter, HTTPException, UploadFile, Query, Request
 from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from starlette import status
-from starlette.responses import StreamingResponse
+from starlette.responses import Response
 
-from api.dependencies.current_user import CurrentUserDep
+from api.dependencies.current_user import CurrentUserDep, invalidate_user
 from api.dependencies.session import SessionDep
-from api.utils.image import upload_image_to_asset
-from api.utils.minio import stream_resource
-from core.minio import minio_client
-from core.settings import settings
+from api.utils.assets import release_assets
+from api.utils.image import IMAGE_BODY_OPENAPI, upload_image_to_asset, upload_request_to_asset
+from api.utils.minio import serve_resource, try_delete_assets
+from api.utils.variants import ImageVariant, resolve_width
+from core.storage import storage
 from models.sucess_response import SuccessResponse
 from models.tables.asset import Asset, AssetVisibility
 from models.tables.user import User
@@ -18,6 +20,24 @@ from models.tables.user import User
 router = APIRouter(prefix="/avatars", tags=["avatars"])
 
 
+async def _replace_avatar(asset: Asset, current_user: User, session: AsyncSession) -> None:
+    old_avatar_asset_id = current_user.avatar_asset_id
+
+    current_user.avatar_asset_id = asset.id
+    session.add(current_user)
+
+    # Drop the reference of the previous avatar (the same asset when setting the same image again)
+    assets: list[Asset] = []
+    if old_avatar_asset_id is not None:
+        assets = await release_assets([old_avatar_asset_id], session)
+
+    await session.commit()
+    invalidate_user(current_user.id)
+
+    # Delete corresponding object in storage once the row is gone
+    await try_delete_assets(storage, assets)
+
+
 @router.post("/avatar")
 async def set_avatar(
         image: UploadFile,
@@ -32,27 +52,29 @@ async def set_avatar(
         visibility=AssetVisibility.PUBLIC, # avatars are public
     )
 
-    # Delete any existing assets first
-    old_avatar_asset: Asset | None = None
-    if current_user.avatar_asset_id is not None:
-        # Get corresponding asset
-        old_avatar_asset = session.get(Asset, current_user.avatar_asset_id)
+    await _replace_avatar(asset, current_user, session)
 
-        # Delete corresponding object in storage
-        minio_client.remove_object(
-            bucket_name=settings.IMAGES_BUCKET,
-            object_name=old_avatar_asset.asset_hash,
-        )
+    return SuccessResponse()
 
-    session.add(asset)
-    current_user.avatar_asset_id = asset.id
-    session.add(current_user)
 
-    # Delete the asset
-    if old_avatar_asset:
-        session.delete(old_avatar_asset)
+@router.post("/avatar/stream", openapi_extra=IMAGE_BODY_OPENAPI)
+async def set_avatar_stream(
+        request: Request,
+        current_user: CurrentUserDep,
+        session: SessionDep
+) -> SuccessResponse:
+    """
+    Same as POST /avatars/avatar, with the image as the whole request body (Content-Type: image/jpeg)
+    instead of a multipart form: it is streamed to storage as it arrives.
+    """
+    asset = await upload_request_to_asset(
+        request=request,
+        current_user=current_user,
+        session=session,
+        visibility=AssetVisibility.PUBLIC, # avatars are public
+    )
 
-    session.commit()
+    await _replace_avatar(asset, current_user, session)
 
     return SuccessResponse()
 
@@ -67,7 +89,7 @@ async def delete_avatar(
         Asset.id == User.avatar_asset_id,
     )
 
-    results = session.exec(statement).first()
+    results = (await session.exec(statement)).first()
     if results is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -76,18 +98,17 @@ async def delete_avatar(
 
     user, asset = results
 
-    # Delete corresponding object in storage
-    minio_client.remove_object(
-        bucket_name=settings.IMAGES_BUCKET,
-        object_name=asset.asset_hash,
-    )
     # update user
     user.avatar_asset_id = None
     session.add(user)
-    # delete asset row
-    session.delete(asset)
+    # drop its reference, the asset row goes with the last one
+    assets = await release_assets([asset.id], session)
     # commit
-    session.commit()
+    await session.commit()
+    invalidate_user(user.id)
+
+    # Delete corresponding object in storage
+    await try_delete_assets(storage, assets)
 
     return SuccessResponse()
 
@@ -95,9 +116,14 @@ async def delete_avatar(
 @router.get("/avatar/{user_id}")
 async def get_avatar(
         user_id: uuid.UUID,
+        request: Request,
         current_user: CurrentUserDep,
-        session: SessionDep
-) -> StreamingResponse:
+        session: SessionDep,
+        w: int | None = Query(default=None, gt=0, description="Serve a resized variant at least this wide"),
+        variant: ImageVariant | None = None,
+) -> Response:
+    width = resolve_width(w, variant)
+
     # TODO: ensure blocked user cannot access data
     if current_user is None:
         raise HTTPException(
@@ -110,7 +136,7 @@ async def get_avatar(
         Asset.id == User.avatar_asset_id,
     )
 
-    results = session.exec(statement).first()
+    results = (await session.exec(statement)).first()
     if results is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -119,7 +145,9 @@ async def get_avatar(
 
     _, asset = results
 
-    return stream_resource(
-        minio_client=minio_client,
+    return await serve_resource(
+        storage=storage,
         asset=asset,
+        request=request,
+        width=width,
     )
\ No newline at end of file
@@ -1,14 +1,18 @@
 import uuid
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from starlette import status
 
 from api.dependencies.current_user import CurrentUserDep
 from api.dependencies.session import SessionDep
+from api.utils.fast_json import page_response, select_rows
+from api.utils.lineage import lineage_statement
+from api.utils.pagination import keyset_paginate, next_page
 from api.utils.permissions import assert_plant_read_permission
+from models.lineage import Lineage, LineageNode
+from models.page import Page
 from models.tables.plant import Plant
 
-from sqlmodel import select
 router = APIRouter(prefix="/cuttings", tags=["cuttings"])
 
 @router.get("/{plant_id}")
@@ -16,21 +20,69 @@ async def get_plant_cuttings(
         plant_id: uuid.UUID,
         current_user: CurrentUserDep,
         session: SessionDep,
-) -> list[Plant]:
+        cursor: str | None = None,
+        limit: int = Query(default=20, le=50),
+) -> Page[Plant]:
     # Get plant by id
-    plant = session.get(Plant, plant_id)
+    plant = await session.get(Plant, plant_id)
     if plant is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Plant not found"
         )
 
-    assert_plant_read_permission(
+    await assert_plant_read_permission(
         plant=plant,
         user=current_user,
         session=session,
     )
 
-    statement = (select(Plant)
-                 .where(Plant.parent_id == plant.id))
-    return session.exec(statement).all()
\ No newline at end of file
+    statement = keyset_paginate(
+        select_rows(Plant).where(Plant.parent_id == plant.id),
+        created_at_column=Plant.created_at,
+        id_column=Plant.id,
+        cursor=cursor,
+        limit=limit,
+    )
+
+    cuttings, next_cursor = next_page((await session.exec(statement)).all(), limit, key=lambda row: (row.created_at, row.id))
+    return page_response(cuttings, next_cursor)
+
+@router.get("/{plant_id}/lineage")
+async def get_plant_lineage(
+        plant_id: uuid.UUID,
+        current_user: CurrentUserDep,
+        session: SessionDep,
+        depth: int = Query(default=10, ge=1, le=100, description="Generations to walk up and down"),
+) -> Lineage:
+    # Get plant by id
+    plant = await session.get(Plant, plant_id)
+    if plant is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Plant not found"
+        )
+
+    await assert_plant_read_permission(
+        plant=plant,
+        user=current_user,
+        session=session,
+    )
+
+    # the rest of the tree is walked, and filtered, by a single recursive query
+    rows = (await session.exec(lineage_statement(plant.id, current_user.id, depth))).all()
+    return Lineage(
+        plant_id=plant.id,
+        nodes=[
+            LineageNode(
+                id=node.id,
+                parent_id=node.parent_id,
+                owner=node.owner,
+                name=node.name,
+                asset_id=node.asset_id,
+                dead=node.dead,
+                depth=node_depth,
+            )
+            for node, node_depth in rows
+        ],
+    )
@@ -1,17 +1,18 @@
 import datetime
 import uuid
 
-from fastapi import APIRouter, UploadFile, Form, HTTPException, Query
+from fastapi import APIRouter, Query
 from pydantic import BaseModel
-from sqlalchemy import func
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from api.dependencies.current_user import CurrentUserDep
 from api.dependencies.session import SessionDep
-from sqlmodel import select
-
-from models.tables.follower import Follower, FollowStatus
-from models.tables.plant import Plant
-from models.tables.plant_update import PlantUpdate
+from api.utils.fast_json import FastJSONResponse
+from api.utils.pagination import keyset_paginate, next_page
+from api.utils.timeline import timeline_statement
+from core.settings import settings
+from models.page import Page
+from models.tables.timeline_entry import TimelineEntry
 from models.tables.user import User
 
 router = APIRouter(prefix="/feed", tags=["feed"])
@@ -26,34 +27,55 @@ class FeedItem(BaseModel):
     asset_id: uuid.UUID
     author: FeedItemAuthor
 
+async def _fast_feed(statement, limit: int, session: AsyncSession) -> FastJSONResponse:
+    # only the columns of a FeedItem, written as is
+    statement = statement.with_only_columns(
+        TimelineEntry.update_id,
+        TimelineEntry.created_at,
+        TimelineEntry.asset_id,
+        TimelineEntry.author,
+        User.username,
+    )
+    rows, next_cursor = next_page((await session.exec(statement)).all(), limit, key=lambda row: (row.created_at, row.update_id))
+
+    return FastJSONResponse({
+        "items": [{
+            "id": row.update_id,
+            "created_at": row.created_at,
+            "asset_id": row.asset_id,
+            "author": {"id": row.author, "username": row.username},
+        } for row in rows],
+        "next_cursor": next_cursor,
+    })
+
 @router.get("/")
 async def get_feed(
         current_user: CurrentUserDep,
-        session: SessionDep
-):
-    # Step 1: Subquery for followers
-    follower_subq = (select(Follower.to_user)
-                     .where(Follower.from_user == current_user.id)
-                     .where(Follower.status == FollowStatus.APPROVED)
-                     )
-
-    # Step 2: Final query for plant updates
-    statement = (
-        select(
-            PlantUpdate,
-            Plant,
-            User,
-        )
-        .join(Plant, onclause=(Plant.id == PlantUpdate.plant_id))
-        .join(User, onclause=(User.id == Plant.owner))
-        .where(Plant.owner.in_(follower_subq))
-        .where(PlantUpdate.created_at > func.now() - datetime.timedelta(hours=24))  # ⬅️ NEW CONDITION
+        session: SessionDep,
+        cursor: str | None = None,
+        limit: int = Query(default=20, le=50),
+) -> Page[FeedItem]:
+    # updates are pushed into the timeline on publish (see api/utils/timeline.py)
+    statement = keyset_paginate(
+        timeline_statement(current_user.id),
+        created_at_column=TimelineEntry.created_at,
+        id_column=TimelineEntry.update_id,
+        cursor=cursor,
+        limit=limit,
     )
 
-    results: list[tuple[PlantUpdate,Plant,User]] = session.exec(statement).all()
-    return [FeedItem(
-        id=plantUpdate.id,
-        created_at=plantUpdate.created_at,
-        asset_id=plantUpdate.asset_id,
-        author=FeedItemAuthor(id=user.id, username=user.username),
-    ) for (plantUpdate, plant, user) in results]
\ No newline at end of file
+    if settings.FAST_JSON_RESPONSES:
+        return await _fast_feed(statement, limit, session)
+
+    results: list[tuple[TimelineEntry, str]] = (await session.exec(statement)).all()
+    results, next_cursor = next_page(results, limit, key=lambda row: (row[0].created_at, row[0].update_id))
+
+    return Page(
+        items=[FeedItem(
+            id=entry.update_id,
+            created_at=entry.created_at,
+            asset_id=entry.asset_id,
+            author=FeedItemAuthor(id=entry.author, username=username),
+        ) for (entry, username) in results],
+        next_cursor=next_cursor,
+    )
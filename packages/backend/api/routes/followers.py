@@ -4,6 +4,8 @@ from fastapi import APIRouter, HTTPException
 
 from api.dependencies.current_user import CurrentUserDep
 from api.dependencies.session import SessionDep
+from api.utils.follow_graph import follow_graph
+from api.utils.timeline import backfill_timeline
 from models.sucess_response import SuccessResponse
 from models.tables.follower import Follower, FollowStatus
 from sqlmodel import select
@@ -22,7 +24,7 @@ async def reject_follower(
         session: SessionDep
 ):
     # Get follow request from user_id to current
-    follow_request = session.get(Follower, (user_id, current_user.id))
+    follow_request = await session.get(Follower, (user_id, current_user.id))
     if follow_request is None or follow_request.status != FollowStatus.PENDING:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -32,7 +34,8 @@ async def reject_follower(
     # create follower relation
     follow_request.status = FollowStatus.REJECTED
     session.add(follow_request)
-    session.commit()
+    # a pending request has no timeline entries, and is not part of the follow graph
+    await session.commit()
 
     return SuccessResponse()
 
@@ -44,7 +47,7 @@ async def accept_follower(
         session: SessionDep
 ):
     # Get follow request from user_id to current
-    follow_request = session.get(Follower, (user_id, current_user.id))
+    follow_request = await session.get(Follower, (user_id, current_user.id))
     if follow_request is None or follow_request.status != FollowStatus.PENDING:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -54,7 +57,10 @@ async def accept_follower(
     # create follower relation
     follow_request.status = FollowStatus.APPROVED
     session.add(follow_request)
-    session.commit()
+    await backfill_timeline(user_id, current_user.id, session)
+    await session.commit()
+    # other replicas pick the new edge up on their first miss
+    follow_graph.add(user_id, current_user.id)
 
     return SuccessResponse()
 
@@ -74,5 +80,5 @@ async def get_pending_followers(
             id=user.id,
             avatar_asset_id=user.avatar_asset_id,
             username=user.username,
-        ) for request, user in session.exec(statement)
+        ) for request, user in await session.exec(statement)
     ]
@@ -22,25 +22,20 @@ async def follow(
             detail="Cannot follow yourself"
         )
 
-    user = session.get(User, to_user)
+    user = await session.get(User, to_user)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
 
-    follower = session.get(Follower, (current_user.id, to_user))
-    if follower is not None:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Already following this user"
-        )
-
-    follow_request = session.get(Follower, (current_user.id, to_user))
+    # a single lookup: the row is either the follow or the pending request
+    follow_request = await session.get(Follower, (current_user.id, to_user))
     if follow_request is not None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Already have pending request"
+            detail="Already have pending request" if follow_request.status == FollowStatus.PENDING
+            else "Already following this user"
         )
 
     # TODO: handle public account
@@ -50,7 +45,7 @@ async def follow(
         to_user=to_user
     )
     session.add(follow_request)
-    session.commit()
+    await session.commit()
 
     return SuccessResponse()
 
@@ -60,12 +55,12 @@ async def get_follow_status(
         current_user: CurrentUserDep,
         session: SessionDep
 ) -> FollowStatus:
-    follow_request = session.get(Follower, (current_user.id, to_user))
+    follow_request = await session.get(Follower, (current_user.id, to_user))
     if follow_request is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No such follow request"
         )
 
-    return follow_request
+    return follow_request.status
 
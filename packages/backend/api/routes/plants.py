@@ -1,20 +1,27 @@
 import uuid
 from typing import Annotated
 
-from fastapi import APIRouter, UploadFile, Form, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, UploadFile, Form, HTTPException, Query, Request
 from sqlmodel import select, delete, update
+from sqlmodel.ext.asyncio.session import AsyncSession
 from starlette import status
 
 from api.dependencies.current_user import CurrentUserDep
 from api.dependencies.session import SessionDep
-from api.utils.image import upload_image_to_asset
-from api.utils.minio import try_delete_asset
+from api.utils.assets import release_assets
+from api.utils.fast_json import page_response, select_rows
+from api.utils.image import IMAGE_BODY_OPENAPI, upload_image_to_asset, upload_request_to_asset
+from api.utils.minio import try_delete_assets
+from api.utils.pagination import keyset_paginate, next_page
 from api.utils.permissions import assert_plant_read_permission, assert_is_follower
-from core.minio import minio_client
+from api.utils.timeline import fan_out_update
+from core.storage import storage
+from models.page import Page
 from models.sucess_response import SuccessResponse
 from models.tables.asset import Asset
 from models.tables.plant import Plant
 from models.tables.plant_update import PlantUpdate
+from models.tables.user import User
 
 router = APIRouter(prefix="/plants", tags=["plants"])
 
@@ -23,35 +30,32 @@ async def get_plants(
         current_user: CurrentUserDep,
         session: SessionDep,
         user_id: uuid.UUID | None = Query(default=None),
-) -> list[Plant]:
+        cursor: str | None = None,
+        limit: int = Query(default=20, le=50),
+) -> Page[Plant]:
     target_user: uuid.UUID = user_id if user_id is not None else current_user.id
     if target_user != current_user.id:
-        assert_is_follower(
+        await assert_is_follower(
             from_user_id=current_user.id,
             to_user_id=user_id,
             session=session,
         )
 
-    statement = (select(Plant)
-                 .where(Plant.owner == target_user)
-                 .order_by(Plant.updated_at.desc())
-                 )
+    statement = keyset_paginate(
+        select_rows(Plant).where(Plant.owner == target_user),
+        created_at_column=Plant.created_at,
+        id_column=Plant.id,
+        cursor=cursor,
+        limit=limit,
+    )
 
-    return session.exec(statement).all()
+    plants, next_cursor = next_page((await session.exec(statement)).all(), limit, key=lambda row: (row.created_at, row.id))
+    return page_response(plants, next_cursor)
 
 
-@router.post("/")
-async def register_plant(
-        current_user: CurrentUserDep,
-        session: SessionDep,
-        name: Annotated[str, Form()],
-        image: UploadFile,
-        parent_id: Annotated[uuid.UUID | None, Form(
-            title="Parent Plant ID",
-        )] = None,
-) -> Plant:
+async def _get_parent(parent_id: uuid.UUID | None, current_user: User, session: AsyncSession) -> Plant | None:
     # if the user provided parent_id, get the corresponding plant
-    parent: Plant | None = session.get(Plant, parent_id) if parent_id is not None else None
+    parent: Plant | None = await session.get(Plant, parent_id) if parent_id is not None else None
 
     # ensure the current is the parent plant owner
     if parent is not None and parent.owner != current_user.id:
@@ -60,13 +64,10 @@ async def register_plant(
             detail="Not authorized to access parent plant"
         )
 
-    # upload asset to minio
-    asset = await upload_image_to_asset(
-        image=image,
-        current_user=current_user,
-        session=session
-    )
+    return parent
 
+
+async def _create_plant(name: str, parent: Plant | None, asset: Asset, current_user: User, session: AsyncSession) -> Plant:
     # create
     user_plant = Plant(
         owner=current_user.id,
@@ -83,20 +84,67 @@ async def register_plant(
     session.add(asset)
     session.add(user_plant)
     session.add(plant_update)
+    await fan_out_update(plant_update, current_user.id, session)
 
-    session.commit()
-    session.refresh(user_plant)
+    await session.commit()
+    await session.refresh(user_plant)
 
     return user_plant
 
 
+@router.post("/")
+async def register_plant(
+        current_user: CurrentUserDep,
+        session: SessionDep,
+        name: Annotated[str, Form()],
+        image: UploadFile,
+        parent_id: Annotated[uuid.UUID | None, Form(
+            title="Parent Plant ID",
+        )] = None,
+) -> Plant:
+    parent = await _get_parent(parent_id, current_user, session)
+
+    # upload asset to minio
+    asset = await upload_image_to_asset(
+        image=image,
+        current_user=current_user,
+        session=session
+    )
+
+    return await _create_plant(name, parent, asset, current_user, session)
+
+
+@router.post("/stream", openapi_extra=IMAGE_BODY_OPENAPI)
+async def register_plant_stream(
+        current_user: CurrentUserDep,
+        session: SessionDep,
+        request: Request,
+        name: str,
+        parent_id: uuid.UUID | None = Query(default=None, title="Parent Plant ID"),
+) -> Plant:
+    """
+    Same as POST /plants/, with the image as the whole request body (Content-Type: image/jpeg)
+    and the other fields in the query: it is streamed to storage as it arrives.
+    """
+    parent = await _get_parent(parent_id, current_user, session)
+
+    asset = await upload_request_to_asset(
+        request=request,
+        current_user=current_user,
+        session=session
+    )
+
+    return await _create_plant(name, parent, asset, current_user, session)
+
+
 @router.delete("/{plant_id}")
 async def delete_plant(
         plant_id: uuid.UUID,
         current_user: CurrentUserDep,
-        session: SessionDep
+        session: SessionDep,
+        background_tasks: BackgroundTasks,
 ) -> SuccessResponse:
-    plant = session.get(Plant, plant_id)
+    plant = await session.get(Plant, plant_id)
     if plant is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -109,31 +157,25 @@ async def delete_plant(
             detail="Not authorized to access this plant"
         )
 
-    # Remove all reference to this plant from other Plant objects
-    update_statement = update(Plant).where(Plant.parent_id == plant.id).values(parent_id=None)
-    session.exec(update_statement)
-    session.commit()
-
-    # Get all PlantUpdate objects associated with this plant & corresponding assets
-    statement = select(PlantUpdate, Asset).join(Asset, onclause=(PlantUpdate.asset_id == Asset.id)).where(PlantUpdate.plant_id == plant.id)
-    items: list[tuple[PlantUpdate, Asset]] = session.exec(statement).all()
+    # A handful of set based statements, in a single transaction
 
-    # Delete PlantUpdate Objects (to free PlantUpdate#asset_id foreign key contraint)
-    for plant_update, _ in items:
-        session.delete(plant_update)
-    session.commit()
+    # Remove all reference to this plant from other Plant objects
+    await session.exec(update(Plant).where(Plant.parent_id == plant.id).values(parent_id=None))
 
-    # Delete Plant Object to free Plant#asset_id foreign key contraint
-    session.delete(plant)
-    session.commit()
+    # Delete the PlantUpdate rows first (PlantUpdate#asset_id foreign key), timeline entries follow by cascade
+    asset_ids: list[uuid.UUID] = list((await session.exec(
+        delete(PlantUpdate).where(PlantUpdate.plant_id == plant.id).returning(PlantUpdate.asset_id)
+    )).scalars().all())
+    # Plant#asset_id is not a counted reference: it shows the asset of one of these updates, which holds it
 
-    # Delete dangling assets
-    for _, asset in items:
-        # Delete corresponding object in storage
-        try_delete_asset(minio_client, asset)
+    # Then the Plant row (Plant#asset_id foreign key), then one reference per update:
+    # the assets left unreferenced are deleted along with their quota
+    await session.exec(delete(Plant).where(Plant.id == plant.id))
+    assets = await release_assets(asset_ids, session)
+    await session.commit()
 
-        session.delete(asset)
-    session.commit()
+    # Remove the objects from storage once the response is sent, in batched requests
+    background_tasks.add_task(try_delete_assets, storage, assets)
 
     return SuccessResponse()
 
@@ -145,7 +187,7 @@ async def get_plant(
         session: SessionDep
 ) -> Plant:
     # Get plant by primary key
-    plant = session.get(Plant, plant_id)
+    plant = await session.get(Plant, plant_id)
     if plant is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -153,6 +195,6 @@ async def get_plant(
         )
 
     # ensure the current user can read plant
-    assert_plant_read_permission(plant, current_user, session)
+    await assert_plant_read_permission(plant, current_user, session)
 
     return plant
@@ -1,31 +1,36 @@
 import uuid
+from typing import Annotated
 
-from fastapi import APIRouter, UploadFile, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Form, UploadFile, HTTPException, Query, Request
 from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from starlette import status
 
 from api.dependencies.current_user import CurrentUserDep
 from api.dependencies.session import SessionDep
-from api.utils.image import upload_image_to_asset
-from api.utils.minio import try_delete_asset
+from api.utils.assets import release_assets
+from api.utils.fast_json import page_response, select_rows
+from api.utils.image import IMAGE_BODY_OPENAPI, upload_image_to_asset, upload_request_to_asset
+from api.utils.minio import try_delete_assets
+from api.utils.pagination import keyset_paginate, next_page
 from api.utils.permissions import assert_plant_read_permission
-from core.minio import minio_client
+from api.utils.timeline import fan_out_update
+from api.utils.update_batch import publish_update_batch
+from core.settings import settings
+from core.storage import storage
+from models.page import Page
 from models.sucess_response import SuccessResponse
 from models.tables.asset import Asset
 from models.tables.plant import Plant
 from models.tables.plant_update import PlantUpdate
+from models.tables.user import User
+from models.update_batch import BatchUpdateResponse
 
 router = APIRouter(prefix="/updates", tags=["plants", "updates"])
 
 
-@router.post("/{plant_id}")
-async def publish_update(
-        plant_id: uuid.UUID,
-        image: UploadFile,
-        current_user: CurrentUserDep,
-        session: SessionDep
-):
-    plant = session.get(Plant, plant_id)
+async def _get_owned_plant(plant_id: uuid.UUID, current_user: User, session: AsyncSession) -> Plant:
+    plant = await session.get(Plant, plant_id)
     if plant is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -38,26 +43,94 @@ async def publish_update(
             detail="Not authorized to access this plant"
         )
 
-    # TODO / IDEA: only allow one update per day (offer to replace existing in frontend)
+    return plant
 
-    asset = await upload_image_to_asset(
-        image=image,
-        current_user=current_user,
-        session=session
-    )
 
+async def _add_update(plant: Plant, asset: Asset, current_user: User, session: AsyncSession) -> None:
     # update plant with new asset
     plant.asset_id = asset.id
 
     plant_update = PlantUpdate(
-        plant_id=plant_id,
+        plant_id=plant.id,
         asset_id=asset.id,
     )
 
     session.add(asset)
     session.add(plant_update)
     session.add(plant)
-    session.commit()
+    await fan_out_update(plant_update, current_user.id, session)
+    await session.commit()
+
+
+# declared before POST /{plant_id}, which would match it
+@router.post("/batch")
+async def publish_updates(
+        current_user: CurrentUserDep,
+        session: SessionDep,
+        plant_ids: Annotated[list[uuid.UUID], Form(description="Plant of each image, in the same order")],
+        images: list[UploadFile],
+        background_tasks: BackgroundTasks,
+) -> BatchUpdateResponse:
+    """
+    Publish several updates at once, for one or more plants: the result of each image is reported separately.
+    """
+    if len(plant_ids) != len(images):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Expected one plant id per image"
+        )
+
+    if len(images) > settings.UPDATE_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Too many images. Maximum is {settings.UPDATE_BATCH_MAX_ITEMS}."
+        )
+
+    return BatchUpdateResponse(items=await publish_update_batch(plant_ids, images, current_user, session, background_tasks))
+
+
+@router.post("/{plant_id}")
+async def publish_update(
+        plant_id: uuid.UUID,
+        image: UploadFile,
+        current_user: CurrentUserDep,
+        session: SessionDep
+):
+    plant = await _get_owned_plant(plant_id, current_user, session)
+
+    # TODO / IDEA: only allow one update per day (offer to replace existing in frontend)
+
+    asset = await upload_image_to_asset(
+        image=image,
+        current_user=current_user,
+        session=session
+    )
+
+    await _add_update(plant, asset, current_user, session)
+
+    return SuccessResponse()
+
+
+@router.post("/{plant_id}/stream", openapi_extra=IMAGE_BODY_OPENAPI)
+async def publish_update_stream(
+        plant_id: uuid.UUID,
+        request: Request,
+        current_user: CurrentUserDep,
+        session: SessionDep
+) -> SuccessResponse:
+    """
+    Same as POST /updates/{plant_id}, with the image as the whole request body (Content-Type: image/jpeg)
+    instead of a multipart form: it is streamed to storage as it arrives.
+    """
+    plant = await _get_owned_plant(plant_id, current_user, session)
+
+    asset = await upload_request_to_asset(
+        request=request,
+        current_user=current_user,
+        session=session
+    )
+
+    await _add_update(plant, asset, current_user, session)
 
     return SuccessResponse()
 
@@ -67,12 +140,11 @@ async def get_plant_updates(
         plant_id: uuid.UUID,
         current_user: CurrentUserDep,
         session: SessionDep,
-        offset: int = 0,
+        cursor: str | None = None,
         limit: int = Query(default=10, le=20),
-
-) -> list[PlantUpdate]:
+) -> Page[PlantUpdate]:
     # Get plant by primary key
-    plant = session.get(Plant, plant_id)
+    plant = await session.get(Plant, plant_id)
     if plant is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -80,15 +152,18 @@ async def get_plant_updates(
         )
 
     # ensure the current user can read plant
-    assert_plant_read_permission(plant, current_user, session)
+    await assert_plant_read_permission(plant, current_user, session)
+
+    query = keyset_paginate(
+        select_rows(PlantUpdate).where(PlantUpdate.plant_id == plant.id),
+        created_at_column=PlantUpdate.created_at,
+        id_column=PlantUpdate.id,
+        cursor=cursor,
+        limit=limit,
+    )
 
-    query = (select(PlantUpdate)
-             .where(PlantUpdate.plant_id == plant.id)
-             .order_by(PlantUpdate.created_at.desc())
-             .offset(offset)
-             .limit(limit)
-             )
-    return session.exec(query).all()
+    updates, next_cursor = next_page((await session.exec(query)).all(), limit, key=lambda row: (row.created_at, row.id))
+    return page_response(updates, next_cursor)
 
 
 @router.delete("/{plant_id}/{update_id}")
@@ -98,20 +173,9 @@ async def delete_update(
         current_user: CurrentUserDep,
         session: SessionDep
 ) -> SuccessResponse:
-    plant = session.get(Plant, plant_id)
-    if plant is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Plant not found"
-        )
-
-    if plant.owner != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Not authorized to access this plant"
-        )
+    plant = await _get_owned_plant(plant_id, current_user, session)
 
-    plant_update = session.get(PlantUpdate, update_id)
+    plant_update = await session.get(PlantUpdate, update_id)
     if plant_update is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -124,17 +188,23 @@ async def delete_update(
             detail="The update id does not correspond to the plant"
         )
 
-    asset = session.get(Asset, plant_update.asset_id)
+    # Delete the update
+    await session.delete(plant_update)
+
+    # the plant shows its newest update: the previous one, if this was it
+    if plant.asset_id == plant_update.asset_id:
+        plant.asset_id = (await session.exec(
+            select(PlantUpdate.asset_id)
+            .where(PlantUpdate.plant_id == plant.id, PlantUpdate.id != plant_update.id)
+            .order_by(PlantUpdate.created_at.desc(), PlantUpdate.id.desc())
+            .limit(1)
+        )).first()
+        session.add(plant)
 
-    try:
-        # Delete plant
-        session.delete(plant_update)
-        session.commit()
+    # Drop its reference to the asset, which goes along with its quota if it was the last one
+    assets = await release_assets([plant_update.asset_id], session)
+    await session.commit()
 
-        # Delete corresponding asset
-        session.delete(asset)
-        session.commit()
-    finally:
-        try_delete_asset(minio_client, asset.asset_hash)
+    await try_delete_assets(storage, assets)
 
     return SuccessResponse()
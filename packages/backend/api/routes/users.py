@@ -5,15 +5,15 @@ from typing import Annotated
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel, SecretStr, EmailStr, constr
 from sqlalchemy.exc import IntegrityError
-from sqlmodel import select, and_
+from sqlmodel import select
 
-from api.dependencies.current_user import CurrentUserDep
+from api.dependencies.current_user import CurrentUserDep, invalidate_user
 from api.dependencies.session import SessionDep
+from api.utils.search import search_users
 from api.utils.usage import get_user_usage
 from core import security
-from core.security import get_password_hash, verify_password
+from core.passwords import hash_password, verify_password
 from core.settings import settings
-from models.tables.follower import Follower
 from models.tables.user import User
 from models.token import Token
 from models.usage import Usage
@@ -45,14 +45,14 @@ async def user_create(user_in: UserCreate, session: SessionDep) -> LoginResponse
         email=user_in.email,
         username=user_in.username,
         # the salt is included in the hash
-        password_hash=get_password_hash(user_in.password.get_secret_value()),
+        password_hash=await hash_password(user_in.password.get_secret_value()),
     )
     # Add it to DB
     session.add(new_user)
 
     try:
         # commit change
-        session.commit()
+        await session.commit()
     except IntegrityError:
         raise HTTPException(
             status_code=401,
@@ -78,19 +78,29 @@ class UserLogin(BaseModel):
 @router.post("/login")
 async def login(user_in: UserLogin, session: SessionDep) -> LoginResponse:
     statement = select(User).where(User.username == user_in.username)
-    user = session.exec(statement).first()
+    user = (await session.exec(statement)).first()
     if user is None:
         raise HTTPException(
             status_code=404,
             detail="User not found",
         )
+    # end the read transaction: its connection goes back to the pool while waiting for a password worker
+    await session.commit()
 
-    if not verify_password(user_in.password.get_secret_value(), user.password_hash):
+    valid, new_password_hash = await verify_password(user_in.password.get_secret_value(), user.password_hash)
+    if not valid:
         raise HTTPException(
             status_code=401,
             detail="Incorrect password",
         )
 
+    # the cost factor changed since this hash was made: store it with the current one
+    if new_password_hash is not None:
+        user.password_hash = new_password_hash
+        session.add(user)
+        await session.commit()
+        invalidate_user(user.id)
+
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     return LoginResponse(
         token=Token(
@@ -118,16 +128,7 @@ async def search(
         current_user: CurrentUserDep,
         session: SessionDep
 ) -> list[UserInfoSearch]:
-    stmt = (
-        select(User, Follower.status)
-        # join Follower table
-        .join(Follower, onclause=and_(Follower.from_user == current_user.id, Follower.to_user == User.id), isouter=True)
-        # username like pattern provided
-        .where(User.username.contains(pattern), User.id != current_user.id)
-        .limit(10)
-    )
-
-    results = session.exec(stmt).all()
+    results = await search_users(current_user.id, pattern, limit=10, session=session)
 
     return [
         UserInfoSearch(
@@ -142,4 +143,7 @@ async def search(
 
 @router.get("/usage")
 async def get_usage(current_user: CurrentUserDep, session: SessionDep) -> Usage:
-    return get_user_usage(current_user, session)
+    usage = await get_user_usage(current_user, session)
+    # persist the ledger row in case it was just seeded
+    await session.commit()
+    return usage
@@ -0,0 +1,89 @@
+import uuid
+from collections import Counter, defaultdict
+
+from sqlalchemy import Integer, Uuid, column, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import delete, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from api.utils.usage import release_usage
+from models.tables.asset import Asset, AssetVisibility
+
+# Assets are deduplicated per author and visibility, by the sha256 of their content: uploading bytes
+# already stored adds a reference to the existing asset instead of a new row and object.
+#
+# Quota: an asset is charged once to its author, when it is created, whatever its number of references,
+# and released when its last reference goes. Deduplication never crosses users: one could otherwise learn
+# that someone else stored a given file, or get hold of it by only knowing its hash.
+
+
+async def reference_existing_asset(
+        author: uuid.UUID,
+        visibility: AssetVisibility,
+        content_hash: str,
+        session: AsyncSession,
+) -> Asset | None:
+    """
+    Add a reference to the asset of this author with this content, if there is one.
+    """
+    statement = (update(Asset)
+                 .where(Asset.author == author,
+                        Asset.asset_visibility == visibility,
+                        Asset.content_hash == content_hash)
+                 .values(refcount=Asset.refcount + 1)
+                 .returning(Asset)
+                 .execution_options(populate_existing=True, synchronize_session=False)
+                 )
+    return (await session.exec(statement)).scalars().first()
+
+
+async def store_asset(asset: Asset, session: AsyncSession) -> Asset:
+    """
+    Insert the asset, or add a reference to the one a concurrent upload of the same content created
+    (the returned asset then has another id: the object of this one is not needed).
+    """
+    statement = insert(Asset).values(
+        id=asset.id,
+        author=asset.author,
+        asset_etag=asset.asset_etag,
+        asset_size=asset.asset_size,
+        content_hash=asset.content_hash,
+        asset_type=asset.asset_type,
+        asset_visibility=asset.asset_visibility,
+        refcount=1,
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[Asset.author, Asset.asset_visibility, Asset.content_hash],
+        set_={"refcount": Asset.refcount + 1},
+    ).returning(Asset).execution_options(populate_existing=True)
+    return (await session.exec(statement)).scalars().one()
+
+
+async def release_assets(asset_ids: list[uuid.UUID], session: AsyncSession) -> list[Asset]:
+    """
+    Drop one reference per id, an id may be repeated. The assets left without references are deleted
+    and their size released from the quota of their author: they are returned for the caller to remove
+    their objects once committed. The rows referencing them must be gone (or flushed) first.
+    """
+    counts = Counter(asset_ids)
+    if not counts:
+        return []
+
+    released = values(column("id", Uuid), column("count", Integer), name="released").data(list(counts.items()))
+    await session.exec(
+        update(Asset)
+        .where(Asset.id == released.c.id)
+        .values(refcount=Asset.refcount - released.c.count)
+        .execution_options(synchronize_session=False)
+    )
+    assets: list[Asset] = list((await session.exec(
+        delete(Asset).where(Asset.id.in_(counts), Asset.refcount <= 0).returning(Asset)
+    )).scalars().all())
+
+    sizes: dict[uuid.UUID, int] = defaultdict(int)
+    for asset in assets:
+        sizes[asset.author] += asset.asset_size
+    for author, size in sizes.items():
+        await release_usage(author, size, session)
+
+    return assets
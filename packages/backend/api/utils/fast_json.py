@@ -0,0 +1,39 @@
+from typing import Any, Sequence
+
+import orjson
+from sqlmodel import SQLModel, select
+from starlette.responses import JSONResponse
+
+from core.settings import settings
+from models.page import Page
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Plain dicts and lists to JSON bytes with orjson: no pydantic model is built nor validated.
+    The content must already have the shape of the route's response model, which still describes it in openapi.
+    """
+
+    def render(self, content: Any) -> bytes:
+        # uuid & datetime are native to orjson, UTC written as 'Z' like pydantic does
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+
+def select_rows(model: type[SQLModel]):
+    """
+    select(model), or with FAST_JSON_RESPONSES the select of its columns: plain rows, no ORM object.
+    """
+    if settings.FAST_JSON_RESPONSES:
+        return select(*model.__table__.columns)
+    return select(model)
+
+
+def page_response(rows: Sequence[Any], next_cursor: str | None) -> Page | FastJSONResponse:
+    """
+    A page of rows from select_rows: a Page validated and serialized by fastapi, or the rows as they are.
+    """
+    if settings.FAST_JSON_RESPONSES:
+        # the column names once for all rows: Row._asdict costs several times the serialization itself
+        keys = rows[0]._fields if rows else ()
+        return FastJSONResponse({"items": [dict(zip(keys, row)) for row in rows], "next_cursor": next_cursor})
+    return Page(items=rows, next_cursor=next_cursor)
@@ -0,0 +1,61 @@
+import uuid
+from collections import defaultdict
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.db import engine
+from models.tables.follower import Follower, FollowStatus
+
+
+class FollowGraph:
+    """
+    In-process index of the APPROVED follow edges, as adjacency sets.
+
+    A hit is authoritative: no route takes an edge out of the APPROVED state. A miss may be
+    an edge approved on another replica, it is confirmed against the database and added
+    (see is_approved_follower), so replicas need no other synchronisation. A path removing
+    edges (unfollow, remove follower) would have to invalidate the graph of every replica.
+    """
+
+    def __init__(self):
+        self._following: dict[uuid.UUID, set[uuid.UUID]] = defaultdict(set)
+
+    def is_following(self, from_user: uuid.UUID, to_user: uuid.UUID) -> bool:
+        followings = self._following.get(from_user)
+        return followings is not None and to_user in followings
+
+    def add(self, from_user: uuid.UUID, to_user: uuid.UUID) -> None:
+        self._following[from_user].add(to_user)
+
+    def replace(self, following: dict[uuid.UUID, set[uuid.UUID]]) -> None:
+        self._following = following
+
+
+follow_graph = FollowGraph()
+
+
+async def load_follow_graph() -> None:
+    async with AsyncSession(engine) as session:
+        following: dict[uuid.UUID, set[uuid.UUID]] = defaultdict(set)
+        statement = (select(Follower.from_user, Follower.to_user)
+                     .where(Follower.status == FollowStatus.APPROVED)
+                     .execution_options(yield_per=10_000)
+                     )
+        async for from_user, to_user in await session.stream(statement):
+            following[from_user].add(to_user)
+
+    follow_graph.replace(following)
+
+
+async def is_approved_follower(from_user: uuid.UUID, to_user: uuid.UUID, session: AsyncSession) -> bool:
+    if follow_graph.is_following(from_user, to_user):
+        return True
+
+    # may have been approved on another replica
+    follow = await session.get(Follower, (from_user, to_user))
+    if follow is None or follow.status != FollowStatus.APPROVED:
+        return False
+
+    follow_graph.add(from_user, to_user)
+    return True
@@ -1,77 +1,265 @@
+import base64
+import binascii
+import hashlib
 import uuid
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
 
-from fastapi import UploadFile, HTTPException
+from fastapi import UploadFile, HTTPException, Request
 from minio.helpers import ObjectWriteResult
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from starlette import status
 
-from api.utils.usage import get_user_usage
-from core.minio import minio_client
+from api.utils.assets import reference_existing_asset, store_asset
+from api.utils.usage import get_user_usage, reserve_usage
+from core.storage import UploadLengthError, UploadTimeoutError, storage
 from core.settings import settings
 from models.tables.asset import Asset, AssetType, AssetVisibility
 from models.tables.user import User
 
 AUTHOR_METADATA_KEY = "author"
 
-async def upload_image_to_asset(
-        image: UploadFile,
-        current_user: User,
-        session: Session,
-        visibility: AssetVisibility = AssetVisibility.PRIVATE,
-) -> Asset:
-    if image.size is None:
-        raise HTTPException(
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            detail="Image size is required."
+# request body of the routes taking the raw image (see upload_request_to_asset), for the openapi schema
+IMAGE_BODY_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {AssetType.IMAGE_JPEG.value: {"schema": {"type": "string", "format": "binary"}}},
+    },
+}
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Image too large. Maximum size is {settings.MAX_IMAGE_SIZE}."
+    )
+
+
+def _no_space_left() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail="Image too large. Not enough space left"
+    )
+
+
+@dataclass
+class StoredImage:
+    # object written to storage, named after the asset to create
+    asset_id: uuid.UUID
+    etag: str
+    size: int
+    # sha256, hex
+    content_hash: str
+
+    def to_asset(self, author: uuid.UUID, visibility: AssetVisibility) -> Asset:
+        return Asset(
+            id=self.asset_id,
+            author=author,
+            asset_etag=self.etag,
+            asset_size=self.size,
+            content_hash=self.content_hash,
+            asset_type=AssetType.IMAGE_JPEG,
+            asset_visibility=visibility,
         )
 
+
+def check_content_type(content_type: str | None) -> None:
     # 🔑 Assert content type from the request header
-    if image.content_type != "image/jpeg":
+    if content_type != AssetType.IMAGE_JPEG:
         raise HTTPException(
             status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
-            detail=f"Unsupported content type: {image.content_type}"
+            detail=f"Unsupported content type: {content_type}"
         )
 
-    if image.size > settings.MAX_IMAGE_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"Image too large. Maximum size is {settings.MAX_IMAGE_SIZE}."
-        )
 
-    usage = get_user_usage(current_user, session)
-    if usage.asset_size_sum + image.size > usage.asset_size_limit:
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail="Image too large. Not enough space left"
-        )
+async def put_image(
+        chunks: AsyncIterator[bytes],
+        size: int | None,
+        author: uuid.UUID,
+        space_left: int,
+) -> StoredImage:
+    """
+    Pipe the chunks to storage as they arrive, the size is optional. The limits are enforced
+    while reading: the upload is aborted at the first byte over MAX_IMAGE_SIZE or space_left.
+    Does not touch the database.
+    """
+    if size is not None and size > settings.MAX_IMAGE_SIZE:
+        raise _too_large()
+    if size is not None and size > space_left:
+        raise _no_space_left()
+
+    received = 0
+    digest = hashlib.sha256()
+
+    async def checked_chunks() -> AsyncIterator[bytes]:
+        nonlocal received
+        async for chunk in chunks:
+            received += len(chunk)
+            if received > settings.MAX_IMAGE_SIZE:
+                raise _too_large()
+            if received > space_left:
+                raise _no_space_left()
+            digest.update(chunk)
+            yield chunk
 
     # Generate a unique asset ID to use as object_name in MinIO
     asset_id = uuid.uuid4()
 
     try:
         # Stream directly to MinIO
-        result: ObjectWriteResult = minio_client.put_object(
-            bucket_name=settings.IMAGES_BUCKET,
+        result: ObjectWriteResult = await storage.put_stream(
             object_name=str(asset_id),
-            data=image.file,
-            length=image.size,
-            content_type=image.content_type,
+            chunks=checked_chunks(),
+            content_type=AssetType.IMAGE_JPEG.value,
+            length=size,
             metadata={
-                AUTHOR_METADATA_KEY: current_user.id,
+                AUTHOR_METADATA_KEY: author,
             }
         )
+    except HTTPException:
+        raise
+    except UploadLengthError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="The image does not match its Content-Length"
+        )
+    except UploadTimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_408_REQUEST_TIMEOUT,
+            detail="Timed out waiting for the image"
+        )
     except Exception:
         raise HTTPException(
             status_code=500,
             detail="Failed to store image"
         )
 
-    # 5. Create the asset row
-    return Asset(
-        id=asset_id,
-        author=current_user.id,
-        asset_etag=result.etag,
-        asset_size=image.size,
-        asset_type=AssetType.IMAGE_JPEG,
-        asset_visibility=visibility,
+    return StoredImage(asset_id=asset_id, etag=result.etag, size=received, content_hash=digest.hexdigest())
+
+
+async def upload_stream_to_asset(
+        chunks: AsyncIterator[bytes],
+        content_type: str | None,
+        size: int | None,
+        current_user: User,
+        session: AsyncSession,
+        visibility: AssetVisibility = AssetVisibility.PRIVATE,
+        content_hash: str | None = None,
+) -> Asset:
+    """
+    Store the image (see put_image) and its asset row, in the caller's transaction. When its content
+    (sha256, hex) is known up front and the user already stored it, a reference to the existing asset
+    is returned without reading the chunks.
+    """
+    check_content_type(content_type)
+
+    if content_hash is not None:
+        existing = await reference_existing_asset(current_user.id, visibility, content_hash, session)
+        if existing is not None:
+            return existing
+
+    # cheap early rejection, the authoritative check is the reservation below
+    usage = await get_user_usage(current_user, session)
+    image = await put_image(chunks, size, current_user.id, usage.asset_size_limit - usage.asset_size_sum)
+
+    if content_hash is not None and content_hash != image.content_hash:
+        await storage.remove_object(object_name=str(image.asset_id))
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="The image does not match its digest"
+        )
+
+    # Create the asset row, unless the same content was stored meanwhile
+    asset = await store_asset(image.to_asset(current_user.id, visibility), session)
+    if asset.id != image.asset_id:
+        await storage.remove_object(object_name=str(image.asset_id))
+        return asset
+
+    # Reserve the quota in the caller's transaction: committed together with the asset row
+    if not await reserve_usage(current_user.id, image.size, session):
+        await storage.remove_object(object_name=str(image.asset_id))
+        raise _no_space_left()
+
+    return asset
+
+
+async def hash_upload(image: UploadFile) -> str:
+    # multipart forms are spooled by starlette before the route runs: hashing the file first
+    # lets a duplicate skip the upload to storage
+    digest = hashlib.sha256()
+    while chunk := await image.read(settings.STORAGE_CHUNK_SIZE):
+        digest.update(chunk)
+    await image.seek(0)
+    return digest.hexdigest()
+
+
+async def iter_upload(image: UploadFile) -> AsyncIterator[bytes]:
+    while chunk := await image.read(settings.STORAGE_CHUNK_SIZE):
+        yield chunk
+
+
+async def upload_image_to_asset(
+        image: UploadFile,
+        current_user: User,
+        session: AsyncSession,
+        visibility: AssetVisibility = AssetVisibility.PRIVATE,
+) -> Asset:
+    content_hash = await hash_upload(image)
+    return await upload_stream_to_asset(
+        iter_upload(image), image.content_type, image.size, current_user, session, visibility, content_hash,
+    )
+
+
+def parse_content_length(header: str) -> int:
+    # a bare decimal number (RFC 9110), no sign nor whitespace inside
+    if not header.strip().isdecimal():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Malformed Content-Length header"
+        )
+    return int(header)
+
+
+def parse_repr_digest(header: str) -> str | None:
+    """
+    The sha256 (hex) of a 'Repr-Digest: sha-256=:<base64>:' header (RFC 9530), None without a sha-256 entry.
+    """
+    for entry in header.split(","):
+        algorithm, _, value = entry.strip().partition("=")
+        if algorithm.strip().lower() != "sha-256":
+            continue
+        try:
+            digest = base64.b64decode(value.strip().strip(":"), validate=True)
+        except binascii.Error:
+            digest = b""
+        if len(digest) != hashlib.sha256().digest_size:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Malformed Repr-Digest header"
+            )
+        return digest.hex()
+    return None
+
+
+async def upload_request_to_asset(
+        request: Request,
+        current_user: User,
+        session: AsyncSession,
+        visibility: AssetVisibility = AssetVisibility.PRIVATE,
+) -> Asset:
+    """
+    The request body is the image itself: read from the socket chunk by chunk, never spooled.
+    Content-Length is optional (chunked transfer encoding). With a Repr-Digest header, an image
+    the user already stored is not read at all.
+    """
+    content_length = request.headers.get("content-length")
+    repr_digest = request.headers.get("repr-digest")
+    return await upload_stream_to_asset(
+        request.stream(),
+        request.headers.get("content-type"),
+        parse_content_length(content_length) if content_length is not None else None,
+        current_user,
+        session,
+        visibility,
+        parse_repr_digest(repr_digest) if repr_digest is not None else None,
     )
@@ -0,0 +1,63 @@
+import uuid
+
+from sqlalchemy import ColumnElement, exists, literal_column, or_
+from sqlalchemy.orm import aliased
+from sqlmodel import select
+
+from models.tables.follower import Follower, FollowStatus
+from models.tables.plant import Plant
+
+
+def _readable(plant: type[Plant], user_id: uuid.UUID) -> ColumnElement[bool]:
+    # same rule as assert_plant_read_permission: own plants, or plants of an approved followee
+    return or_(
+        plant.owner == user_id,
+        exists().where(
+            Follower.from_user == user_id,
+            Follower.to_user == plant.owner,
+            Follower.status == FollowStatus.APPROVED,
+        ),
+    )
+
+
+def lineage_statement(plant_id: uuid.UUID, user_id: uuid.UUID, max_depth: int):
+    """
+    Ancestors and descendants of a plant, up to max_depth generations each way, in a single query.
+    The walk stops at plants the user cannot read: their ancestors or descendants are not returned either.
+    """
+    # walk down: children join on parent_id (ix_plant_parent_id_created_at_id)
+    descendants = (
+        select(Plant.id, literal_column("0").label("depth"))
+        .where(Plant.id == plant_id)
+        .cte("descendants", recursive=True)
+    )
+    child = aliased(Plant)
+    descendants = descendants.union_all(
+        select(child.id, descendants.c.depth + 1)
+        .join(descendants, child.parent_id == descendants.c.id)
+        .where(descendants.c.depth < max_depth, _readable(child, user_id))
+    )
+
+    # walk up: the parent is a primary key lookup
+    ancestors = (
+        select(Plant.id, Plant.parent_id, literal_column("0").label("depth"))
+        .where(Plant.id == plant_id)
+        .cte("ancestors", recursive=True)
+    )
+    parent = aliased(Plant)
+    ancestors = ancestors.union_all(
+        select(parent.id, parent.parent_id, ancestors.c.depth - 1)
+        .join(ancestors, parent.id == ancestors.c.parent_id)
+        .where(ancestors.c.depth > -max_depth, _readable(parent, user_id))
+    )
+
+    # the requested plant is in both walks, keep it once
+    tree = select(descendants.c.id, descendants.c.depth).union_all(
+        select(ancestors.c.id, ancestors.c.depth).where(ancestors.c.depth < 0)
+    ).subquery("tree")
+
+    return (
+        select(Plant, tree.c.depth)
+        .join(tree, Plant.id == tree.c.id)
+        .order_by(tree.c.depth, Plant.created_at, Plant.id)
+    )
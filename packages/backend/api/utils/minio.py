@@ -1,11 +1,27 @@
-from fastapi import HTTPException
-from minio import Minio
+import time
+from datetime import datetime, timedelta, timezone
+from functools import partial
+
+from fastapi import HTTPException, Request
 from minio.error import S3Error
 from starlette import status
-from starlette.responses import StreamingResponse
+from starlette.responses import FileResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
 
+from api.utils.variants import ensure_variant, variant_object_names
+from core import metrics
+from core.cache import TTLCache
+from core.disk_cache import asset_cache
 from core.settings import settings
-from models.tables.asset import Asset, AssetType
+from core.storage import AsyncStorage
+from models.presigned_url import PresignedUrl
+from models.tables.asset import Asset, AssetType, AssetVisibility
+
+# (object name, ttl bucket) -> presigned url, see get_presigned_url
+_presigned_urls: TTLCache[tuple[str, int], PresignedUrl] = TTLCache(
+    maxsize=100_000,
+    ttl=settings.PRESIGNED_URL_TTL / 2,
+)
+metrics.register_cache("presigned_url", _presigned_urls)
 
 
 def get_extension(asset_type: AssetType) -> str:
@@ -16,26 +32,121 @@ def get_extension(asset_type: AssetType) -> str:
             raise ValueError(f"Unsupported asset type: {asset_type}")
 
 
-def stream_resource(
-        minio_client: Minio,
-        asset: Asset,
-) -> StreamingResponse:
+def get_cache_control(asset: Asset) -> str:
+    # objects are immutable: every upload gets a new asset id
+    if asset.asset_visibility == AssetVisibility.PUBLIC:
+        return f"public, max-age={settings.PUBLIC_ASSET_MAX_AGE}, immutable"
+    # follower only: shared caches must not keep it, and access may be revoked
+    return f"private, max-age={settings.PRIVATE_ASSET_MAX_AGE}, immutable"
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """
+    Weak comparison of an If-None-Match / If-Range header against our (quoted) etag.
+    """
+    candidates = [candidate.strip().removeprefix("W/") for candidate in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Parse a single 'bytes=start-end' range into inclusive (start, end) offsets.
+    Returns None when the header should be ignored (other units, multiple ranges, malformed),
+    raises a 416 when the range cannot be satisfied.
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip() != "bytes" or "," in ranges:
+        return None
+
+    start, _, end = ranges.strip().partition("-")
     try:
-        # 1. Get the object from MinIO
-        response = minio_client.get_object(
-            bucket_name=settings.IMAGES_BUCKET,
-            object_name=str(asset.id),
-        )
+        if start == "":
+            # suffix range: the last N bytes
+            start, end = max(0, size - int(end)), size - 1
+        else:
+            start, end = int(start), (int(end) if end else size - 1)
+    except ValueError:
+        return None
 
-        # 2. Stream the content back to the client
-        return StreamingResponse(
-            response,
-            media_type=asset.asset_type.value, # enum string value
-            headers={
-                "Content-Disposition": f"inline; filename={asset.id}.{get_extension(asset.asset_type)}",
-                "ETag": asset.asset_etag,
-            }
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
         )
+
+    return start, min(end, size - 1)
+
+
+def get_etag(asset: Asset, width: int | None) -> str:
+    return f'"{asset.asset_etag}"' if width is None else f'"{asset.asset_etag}-w{width}"'
+
+
+def get_cache_key(asset: Asset, width: int | None) -> str:
+    # file name in the local asset cache, grouped by asset id (see try_delete_assets)
+    if width is None:
+        return f"{asset.id}.{asset.asset_etag}"
+    return f"{asset.id}.w{width}.{asset.asset_etag}"
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    # The client already has this exact content: decided from the asset row alone
+    if_none_match = request.headers.get("if-none-match")
+    return if_none_match is not None and etag_matches(if_none_match, etag)
+
+
+async def stream_resource(
+        storage: AsyncStorage,
+        asset: Asset,
+        request: Request,
+        width: int | None = None,
+) -> Response:
+    etag = get_etag(asset, width)
+    headers = {
+        "Content-Disposition": f"inline; filename={asset.id}.{get_extension(asset.asset_type)}",
+        "ETag": etag,
+        "Cache-Control": get_cache_control(asset),
+        "Accept-Ranges": "bytes",
+    }
+
+    if is_not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if asset_cache.enabled and asset.asset_size <= asset_cache.max_bytes:
+        return await cached_resource(storage, asset, headers, width)
+
+    object_name = str(asset.id)
+    size = asset.asset_size
+    if width is not None:
+        object_name = await ensure_variant(storage, asset, width)
+
+    # Range requests, unless If-Range refers to another version
+    byte_range: tuple[int, int] | None = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header is not None and (if_range is None or etag_matches(if_range, etag)):
+        if width is not None:
+            try:
+                size = (await storage.stat_object(object_name)).size
+            except S3Error:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Image not found"
+                )
+        byte_range = parse_range(range_header, size)
+
+    try:
+        # 1. Get the object (or the requested slice of it) from MinIO
+        if byte_range is None:
+            response = await storage.get_object(
+                object_name=object_name,
+            )
+        else:
+            response = await storage.get_object(
+                object_name=object_name,
+                offset=byte_range[0],
+                length=byte_range[1] - byte_range[0] + 1,
+            )
     except Exception as e:
         print(e)
         raise HTTPException(
@@ -43,13 +154,125 @@ def stream_resource(
             detail="Image not found"
         )
 
+    if byte_range is not None:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+    elif width is None:
+        headers["Content-Length"] = str(size)
 
-def try_delete_asset(minio_client: Minio, asset: Asset) -> None:
-    try:
-        # Delete corresponding object in storage
-        minio_client.remove_object(
-            bucket_name=settings.IMAGES_BUCKET,
-            object_name=str(asset.id),
+    # 2. Stream the content back to the client
+    return StreamingResponse(
+        storage.iter_response(response),
+        status_code=status.HTTP_200_OK if byte_range is None else status.HTTP_206_PARTIAL_CONTENT,
+        media_type=asset.asset_type.value, # enum string value
+        headers=headers,
+    )
+
+
+async def cached_resource(
+        storage: AsyncStorage,
+        asset: Asset,
+        headers: dict[str, str],
+        width: int | None = None,
+) -> FileResponse:
+    """
+    Serve the asset from the local disk cache, downloading it from MinIO first on a miss.
+    """
+    key = get_cache_key(asset, width)
+    cached = asset_cache.get(key)
+    if cached is None:
+        object_name = str(asset.id) if width is None else await ensure_variant(storage, asset, width)
+        try:
+            cached = await asset_cache.fill(key, partial(storage.download_object, object_name))
+        except Exception as e:
+            print(e)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Image not found"
+            )
+
+    path, stat = cached
+    # Range & If-Range (against our ETag) are handled by FileResponse, which uses sendfile when the server allows
+    return FileResponse(
+        path,
+        media_type=asset.asset_type.value,
+        headers=headers,
+        stat_result=stat,
+    )
+
+
+def get_presigned_url(storage: AsyncStorage, object_name: str) -> PresignedUrl:
+    """
+    Presigned urls are valid PRESIGNED_URL_TTL seconds and reused within time buckets of half that:
+    a url handed out is always valid for at least PRESIGNED_URL_TTL / 2 seconds.
+    """
+    half_ttl = settings.PRESIGNED_URL_TTL / 2
+    now = time.time()
+    ttl_bucket = int(now // half_ttl)
+
+    presigned = _presigned_urls.get((object_name, ttl_bucket))
+    if presigned is not None:
+        return presigned
+
+    presigned = PresignedUrl(
+        url=storage.presigned_get_object(object_name, expires=timedelta(seconds=settings.PRESIGNED_URL_TTL)),
+        expires_at=datetime.fromtimestamp(now + settings.PRESIGNED_URL_TTL, tz=timezone.utc),
+    )
+    _presigned_urls.set((object_name, ttl_bucket), presigned, ttl=(ttl_bucket + 1) * half_ttl - now)
+    return presigned
+
+
+async def presign_resource(
+        storage: AsyncStorage,
+        asset: Asset,
+        request: Request,
+        width: int | None = None,
+) -> Response:
+    etag = get_etag(asset, width)
+    if is_not_modified(request, etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={"ETag": etag, "Cache-Control": get_cache_control(asset)},
         )
-    except S3Error as e:
+
+    object_name = str(asset.id) if width is None else await ensure_variant(storage, asset, width)
+    presigned = get_presigned_url(storage, object_name)
+
+    # the answer may be reused as long as the url it carries is valid
+    max_age = max(0, int(presigned.expires_at.timestamp() - time.time() - settings.PRESIGNED_URL_TTL / 2))
+    headers = {"Cache-Control": f"private, max-age={max_age}"}
+
+    if settings.ASSET_DELIVERY == "json":
+        return JSONResponse(presigned.model_dump(mode="json"), headers=headers)
+    return RedirectResponse(presigned.url, status_code=status.HTTP_307_TEMPORARY_REDIRECT, headers=headers)
+
+
+async def serve_resource(
+        storage: AsyncStorage,
+        asset: Asset,
+        request: Request,
+        width: int | None = None,
+) -> Response:
+    """
+    Deliver an asset the permission checks allowed, according to ASSET_DELIVERY.
+    """
+    if settings.ASSET_DELIVERY == "stream":
+        return await stream_resource(storage, asset, request, width)
+    return await presign_resource(storage, asset, request, width)
+
+
+async def try_delete_assets(storage: AsyncStorage, assets: list[Asset]) -> None:
+    object_names: list[str] = []
+    for asset in assets:
+        asset_cache.invalidate_group(str(asset.id))
+        # the original object, along with its resized variants
+        object_names += [str(asset.id), *variant_object_names(asset)]
+
+    try:
+        # Delete corresponding objects in storage (batched by the client, 1000 keys per request)
+        errors = await storage.remove_objects(object_names)
+        for error in errors:
+            print(f"Error deleting object: {error}")
+    except (S3Error, TimeoutError) as e:
         print(f"Error deleting object: {e}")
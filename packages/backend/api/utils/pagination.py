@@ -0,0 +1,54 @@
+import base64
+import datetime
+import uuid
+from typing import Any, Callable, Sequence, TypeVar
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+from starlette import status
+
+T = TypeVar("T")
+
+
+def encode_cursor(created_at: datetime.datetime, row_id: uuid.UUID) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, uuid.UUID]:
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.datetime.fromisoformat(created_at), uuid.UUID(row_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def keyset_paginate(statement, created_at_column, id_column, cursor: str | None, limit: int):
+    """
+    Newest first keyset pagination on (created_at, id): the cursor is the key of the last row returned,
+    so every page is an index range scan no matter how deep the client scrolls.
+    One extra row is fetched to know whether there is a next page (see next_page).
+    """
+    if cursor is not None:
+        created_at, row_id = decode_cursor(cursor)
+        statement = statement.where(tuple_(created_at_column, id_column) < tuple_(created_at, row_id))
+
+    return (statement
+            .order_by(created_at_column.desc(), id_column.desc())
+            .limit(limit + 1)
+            )
+
+
+def next_page(
+        rows: Sequence[T],
+        limit: int,
+        key: Callable[[T], tuple[datetime.datetime, uuid.UUID]],
+) -> tuple[Sequence[T], str | None]:
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    return rows, encode_cursor(*key(rows[-1]))
@@ -1,39 +1,31 @@
 import uuid
 
 from fastapi import HTTPException
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from starlette import status
 
-from models.tables.follower import Follower, FollowStatus
+from api.utils.follow_graph import is_approved_follower
 from models.tables.plant import Plant
 from models.tables.user import User
 
 
-def assert_is_follower(
+async def assert_is_follower(
         from_user_id: uuid.UUID,
         to_user_id:  uuid.UUID,
-        session: Session
+        session: AsyncSession
 ) -> None:
-    # if owner != current user check follower status
-    follow_request = session.get(Follower, (from_user_id, to_user_id))
-    if follow_request is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Not authorized to access this plant"
-        )
-
     # if the current user is not an approved follower reject access
-    if follow_request.status != FollowStatus.APPROVED:
+    if not await is_approved_follower(from_user_id, to_user_id, session):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Not authorized to access this plant"
         )
 
 
-def assert_plant_read_permission(
+async def assert_plant_read_permission(
         plant: Plant,
         user: User,
-        session: Session
+        session: AsyncSession
 ) -> None:
     """
     Asserts if the user has permission to read the specified plant.
@@ -43,7 +35,7 @@ def assert_plant_read_permission(
         return
 
     # if owner != current user check follower status
-    assert_is_follower(
+    await assert_is_follower(
         from_user_id=user.id,
         to_user_id=plant.owner,
         session=session,
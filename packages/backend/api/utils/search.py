@@ -0,0 +1,54 @@
+import uuid
+
+from sqlalchemy import ColumnElement, func
+from sqlmodel import and_, not_, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models.tables.follower import Follower, FollowStatus
+from models.tables.user import User
+
+
+def like_escape(value: str) -> str:
+    # backslash is the default LIKE escape character in postgres
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_statement(current_user_id: uuid.UUID, condition: ColumnElement[bool], limit: int):
+    return (
+        select(User, Follower.status)
+        # join Follower table
+        .join(Follower, onclause=and_(Follower.from_user == current_user_id, Follower.to_user == User.id), isouter=True)
+        .where(condition, User.id != current_user_id)
+        .limit(limit)
+    )
+
+
+async def search_users(
+        current_user_id: uuid.UUID,
+        pattern: str,
+        limit: int,
+        session: AsyncSession,
+) -> list[tuple[User, FollowStatus | None]]:
+    """
+    Users whose username contains the pattern: the exact match first, then the prefix matches
+    (alphabetically), then the other substring matches (shortest first).
+    """
+    # usernames are lowercase
+    pattern = like_escape(pattern.lower())
+
+    # 1. exact & prefix matches, served by the pattern btree (ix_user_username_pattern)
+    # the exact match is the smallest string starting with the pattern
+    prefix_condition = User.username.like(f"{pattern}%")
+    results = list((await session.exec(
+        search_statement(current_user_id, prefix_condition, limit).order_by(User.username)
+    )).all())
+    if len(results) == limit:
+        return results
+
+    # 2. the other substring matches, served by the trigram index (ix_user_username_trgm)
+    substring_condition = and_(User.username.like(f"%{pattern}%"), not_(prefix_condition))
+    results += (await session.exec(
+        search_statement(current_user_id, substring_condition, limit - len(results))
+        .order_by(func.length(User.username), User.username)
+    )).all()
+    return results
@@ -0,0 +1,165 @@
+import logging
+import uuid
+from collections.abc import AsyncIterator
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.db import engine
+from core.settings import settings
+from core.storage import AsyncStorage, storage
+from models.tables.asset import Asset
+
+logger = logging.getLogger('uvicorn.error')
+
+# any constant: only one replica collects at a time
+STORAGE_GC_LOCK_ID = 7_142_028
+
+# objects removed per request, and asset ids read per query
+BATCH_SIZE = 1000
+# dangling rows listed in the report, the others are only counted
+MAX_REPORTED = 100
+
+
+@dataclass
+class GcReport:
+    objects: int = 0
+    # objects whose asset row does not exist
+    orphans: int = 0
+    orphan_bytes: int = 0
+    # orphans kept because they may belong to an upload not committed yet
+    recent: int = 0
+    # keys which are not '<asset id>' or '<asset id>/<variant>'
+    unknown: int = 0
+    # asset rows whose original object does not exist
+    dangling: int = 0
+    dangling_ids: list[uuid.UUID] = field(default_factory=list)
+    # per object errors returned by minio
+    errors: int = 0
+
+
+async def _asset_ids() -> AsyncIterator[uuid.UUID]:
+    # keyset pages of the primary key index: short queries, no transaction held during the whole listing
+    last: uuid.UUID | None = None
+    async with AsyncSession(engine) as session:
+        while True:
+            statement = select(Asset.id).order_by(Asset.id).limit(BATCH_SIZE)
+            if last is not None:
+                statement = statement.where(Asset.id > last)
+            ids = (await session.exec(statement)).all()
+            # release the connection between two pages
+            await session.commit()
+            for asset_id in ids:
+                yield asset_id
+            if len(ids) < BATCH_SIZE:
+                return
+            last = ids[-1]
+
+
+def _parse_asset_id(object_name: str) -> uuid.UUID | None:
+    # objects are named after their asset: '<asset id>' for the original, '<asset id>/w<width>' for variants
+    prefix = object_name.split("/", 1)[0]
+    try:
+        asset_id = uuid.UUID(prefix)
+    except ValueError:
+        return None
+    # only the canonical form sorts like the uuid itself
+    return asset_id if str(asset_id) == prefix else None
+
+
+async def collect_garbage(storage: AsyncStorage, dry_run: bool = False) -> GcReport:
+    """
+    Merge the bucket listing with the asset table, both in asset id order, in constant memory.
+    Objects without an asset row are removed (in batches), asset rows without an object are reported.
+
+    A canonical uuid string sorts like the uuid (and the postgres uuid type) and '/' sorts before
+    any hex digit, so the keys of an asset and of its variants are listed together, in id order.
+    """
+    report = GcReport()
+    min_last_modified = datetime.now(timezone.utc) - timedelta(seconds=settings.STORAGE_GC_MIN_AGE)
+    orphans: list[str] = []
+
+    async def flush() -> None:
+        if not dry_run and orphans:
+            errors = await storage.remove_objects(orphans)
+            for error in errors:
+                logger.warning(f"storage gc: could not delete {error.name}: {error.message}")
+            report.errors += len(errors)
+        orphans.clear()
+
+    def dangling(asset_id: uuid.UUID) -> None:
+        report.dangling += 1
+        if len(report.dangling_ids) < MAX_REPORTED:
+            report.dangling_ids.append(asset_id)
+
+    async with aclosing(_asset_ids()) as asset_ids:
+        # current asset row of the merge, and whether its original object was listed
+        asset_id = await anext(asset_ids, None)
+        has_original = False
+
+        async for obj in storage.list_objects(page_size=BATCH_SIZE):
+            report.objects += 1
+            object_asset_id = _parse_asset_id(obj.object_name)
+            if object_asset_id is None:
+                report.unknown += 1
+                continue
+
+            # the rows before this object have no object at all
+            while asset_id is not None and asset_id < object_asset_id:
+                if not has_original:
+                    dangling(asset_id)
+                asset_id, has_original = await anext(asset_ids, None), False
+
+            if asset_id == object_asset_id:
+                has_original = has_original or obj.object_name == str(asset_id)
+                continue
+
+            # no row for this object
+            if obj.last_modified is None or obj.last_modified > min_last_modified:
+                report.recent += 1
+                continue
+
+            report.orphans += 1
+            report.orphan_bytes += obj.size or 0
+            orphans.append(obj.object_name)
+            if len(orphans) >= BATCH_SIZE:
+                await flush()
+
+        await flush()
+
+        # the rows after the last object
+        while asset_id is not None:
+            if not has_original:
+                dangling(asset_id)
+            asset_id, has_original = await anext(asset_ids, None), False
+
+    return report
+
+
+def log_report(report: GcReport, dry_run: bool = False) -> None:
+    action = "would remove" if dry_run else "removed"
+    logger.info(f"storage gc: {report.objects} objects listed, {action} {report.orphans} orphans "
+                f"({report.orphan_bytes} bytes, {report.errors} errors), kept {report.recent} recent ones, "
+                f"{report.unknown} unknown keys")
+    if report.dangling:
+        logger.warning(f"storage gc: {report.dangling} assets have no object in storage: "
+                       f"{', '.join(str(asset_id) for asset_id in report.dangling_ids)}"
+                       f"{', ...' if report.dangling > len(report.dangling_ids) else ''}")
+
+
+async def run_storage_gc() -> None:
+    """
+    Periodic job: collect the garbage, unless another replica is already doing it.
+    """
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        if not (await conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": STORAGE_GC_LOCK_ID})).scalar():
+            return
+        try:
+            log_report(await collect_garbage(storage))
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": STORAGE_GC_LOCK_ID})
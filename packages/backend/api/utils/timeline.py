@@ -0,0 +1,103 @@
+import datetime
+import uuid
+
+from sqlalchemy import func, literal
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import select, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.db import engine
+from core.settings import settings
+from models.tables.follower import Follower, FollowStatus
+from models.tables.plant import Plant
+from models.tables.plant_update import PlantUpdate
+from models.tables.timeline_entry import TimelineEntry
+from models.tables.user import User
+
+FEED_WINDOW = datetime.timedelta(hours=settings.FEED_WINDOW_HOURS)
+
+
+async def fan_out_update(plant_update: PlantUpdate, author: uuid.UUID, session: AsyncSession) -> None:
+    """
+    Push a new plant update into the timeline of every approved follower of its author.
+    Runs in the caller's transaction, so the update and its timeline entries commit together.
+    """
+    followers = (select(
+                     Follower.from_user,
+                     literal(plant_update.id),
+                     literal(plant_update.created_at),
+                     literal(author),
+                     literal(plant_update.asset_id),
+                 )
+                 .where(Follower.to_user == author)
+                 .where(Follower.status == FollowStatus.APPROVED)
+                 )
+
+    await session.exec(
+        insert(TimelineEntry)
+        .from_select(["user_id", "update_id", "created_at", "author", "asset_id"], followers)
+        .on_conflict_do_nothing()
+    )
+
+
+async def backfill_timeline(follower: uuid.UUID, followee: uuid.UUID, session: AsyncSession) -> None:
+    """
+    Copy the recent updates of followee into the timeline of a newly approved follower.
+    """
+    updates = (select(
+                   literal(follower),
+                   PlantUpdate.id,
+                   PlantUpdate.created_at,
+                   Plant.owner,
+                   PlantUpdate.asset_id,
+               )
+               .join(Plant, onclause=(Plant.id == PlantUpdate.plant_id))
+               .where(Plant.owner == followee)
+               .where(PlantUpdate.created_at > func.now() - FEED_WINDOW)
+               )
+
+    await session.exec(
+        insert(TimelineEntry)
+        .from_select(["user_id", "update_id", "created_at", "author", "asset_id"], updates)
+        .on_conflict_do_nothing()
+    )
+
+
+async def prune_expired_timeline() -> None:
+    # entries older than the feed window are never read again
+    async with AsyncSession(engine) as session:
+        await session.exec(
+            delete(TimelineEntry)
+            .where(TimelineEntry.created_at <= func.now() - FEED_WINDOW)
+        )
+        await session.commit()
+
+
+def timeline_statement(user_id: uuid.UUID):
+    """
+    Fan-out-on-write feed: a single range scan of the (user_id, created_at, update_id) index
+    once paginated on (TimelineEntry.created_at, TimelineEntry.update_id).
+    """
+    return (select(TimelineEntry, User.username)
+            .join(User, onclause=(User.id == TimelineEntry.author))
+            .where(TimelineEntry.user_id == user_id)
+            .where(TimelineEntry.created_at > func.now() - FEED_WINDOW)
+            )
+
+
+def fan_out_on_read_statement(user_id: uuid.UUID):
+    """
+    Fan-out-on-read feed: joins the updates of every followed account at read time.
+    Kept to compare both strategies (see benchmarks/feed_strategies.py).
+    """
+    follower_subq = (select(Follower.to_user)
+                     .where(Follower.from_user == user_id)
+                     .where(Follower.status == FollowStatus.APPROVED)
+                     )
+
+    return (select(PlantUpdate, Plant, User)
+            .join(Plant, onclause=(Plant.id == PlantUpdate.plant_id))
+            .join(User, onclause=(User.id == Plant.owner))
+            .where(Plant.owner.in_(follower_subq))
+            .where(PlantUpdate.created_at > func.now() - FEED_WINDOW)
+            )
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass
+
+from fastapi import BackgroundTasks, HTTPException, UploadFile
+from minio.error import S3Error
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette import status
+
+from api.utils.assets import reference_existing_asset, store_asset
+from api.utils.image import StoredImage, check_content_type, hash_upload, iter_upload, put_image
+from api.utils.timeline import fan_out_update
+from api.utils.usage import get_user_usage, release_usage, reserve_usage
+from core.settings import settings
+from core.storage import storage
+from models.tables.asset import Asset, AssetVisibility
+from models.tables.plant import Plant
+from models.tables.plant_update import PlantUpdate
+from models.tables.user import User
+from models.update_batch import BatchUpdateResult
+
+logger = logging.getLogger('uvicorn.error')
+
+
+@dataclass
+class _Item:
+    index: int
+    plant_id: uuid.UUID
+    image: UploadFile
+    content_hash: str | None = None
+    # set when the image has to be uploaded, None when the user already stored it
+    stored: StoredImage | None = None
+    update: PlantUpdate | None = None
+    error: HTTPException | None = None
+    # the first occurrence of the same image in the batch, whose upload this one shares
+    first: "_Item | None" = None
+
+
+def _check_plant(plant: Plant | None, current_user: User) -> None:
+    if plant is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Plant not found"
+        )
+
+    if plant.owner != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authorized to access this plant"
+        )
+
+
+async def _remove_unused(object_names: list[str]) -> None:
+    try:
+        errors = await storage.remove_objects(object_names)
+        for error in errors:
+            logger.warning(f"update batch: could not delete {error.name}: {error.message}")
+    except (S3Error, TimeoutError) as e:
+        logger.warning(f"update batch: could not delete {len(object_names)} unused objects: {e}")
+
+
+async def publish_update_batch(
+        plant_ids: list[uuid.UUID],
+        images: list[UploadFile],
+        current_user: User,
+        session: AsyncSession,
+        background_tasks: BackgroundTasks,
+) -> list[BatchUpdateResult]:
+    """
+    Publish images[i] as an update of plant_ids[i], for every i.
+
+    Images are checked one by one, the quota up front for all of them. The new ones are uploaded
+    in parallel (at most UPDATE_BATCH_CONCURRENCY at once), then every row is written in a single
+    transaction, in order, each new image reserving its own quota: each plant shows the last of its
+    images. An image which fails does not prevent the others from being published, each one gets its
+    own result. The objects left unused are removed in background_tasks.
+    """
+    items = [_Item(index, plant_id, image) for index, (plant_id, image) in enumerate(zip(plant_ids, images))]
+    plants = {plant.id: plant for plant in (await session.exec(select(Plant).where(Plant.id.in_(set(plant_ids))))).all()}
+
+    for item in items:
+        try:
+            _check_plant(plants.get(item.plant_id), current_user)
+            check_content_type(item.image.content_type)
+            item.content_hash = await hash_upload(item.image)
+        except HTTPException as e:
+            item.error = e
+
+    pending = [item for item in items if item.error is None]
+
+    # content the user already stored is only referenced
+    stored_hashes = set((await session.exec(select(Asset.content_hash).where(
+        Asset.author == current_user.id,
+        Asset.asset_visibility == AssetVisibility.PRIVATE,
+        Asset.content_hash.in_({item.content_hash for item in pending}),
+    ))).all())
+
+    # the quota is checked once: images are admitted in order while they fit, the authoritative check
+    # is the reservation of their total below
+    usage = await get_user_usage(current_user, session)
+    space_left = usage.asset_size_limit - usage.asset_size_sum
+    uploads: list[_Item] = []
+    # the same image twice in the batch is uploaded once: the repeats reference the first occurrence
+    firsts: dict[str, _Item] = {}
+    for item in pending:
+        if item.content_hash in stored_hashes:
+            continue
+        item.first = firsts.get(item.content_hash)
+        if item.first is not None:
+            continue
+        firsts[item.content_hash] = item
+        size = item.image.size if item.image.size is not None else settings.MAX_IMAGE_SIZE
+        if size <= space_left:
+            space_left -= size
+            uploads.append(item)
+        else:
+            item.error = HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="Image too large. Not enough space left"
+            )
+
+    semaphore = asyncio.Semaphore(settings.UPDATE_BATCH_CONCURRENCY)
+
+    async def upload(item: _Item) -> None:
+        async with semaphore:
+            try:
+                item.stored = await put_image(iter_upload(item.image), item.image.size, current_user.id,
+                                              item.image.size or settings.MAX_IMAGE_SIZE)
+            except HTTPException as e:
+                item.error = e
+
+    await asyncio.gather(*(upload(item) for item in uploads))
+
+    # then the rows, in a single transaction
+    unused: list[str] = []
+    for item in items:
+        # a repeat fails like the image it depends on (refused, not uploaded or over the quota)
+        if item.first is not None and item.first.error is not None:
+            item.error = item.first.error
+        if item.error is not None:
+            continue
+
+        if item.stored is not None:
+            # the authoritative quota check, image by image: one which does not fit fails alone
+            if not await reserve_usage(current_user.id, item.stored.size, session):
+                item.error = HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail="Image too large. Not enough space left"
+                )
+                unused.append(str(item.stored.asset_id))
+                continue
+            asset = await store_asset(item.stored.to_asset(current_user.id, AssetVisibility.PRIVATE), session)
+            if asset.id != item.stored.asset_id:
+                # the same content was stored meanwhile: nothing new to count
+                await release_usage(current_user.id, item.stored.size, session)
+                unused.append(str(item.stored.asset_id))
+        else:
+            asset = await reference_existing_asset(current_user.id, AssetVisibility.PRIVATE, item.content_hash, session)
+            if asset is None:
+                item.error = HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="The image is not stored anymore, retry"
+                )
+                continue
+
+        item.update = PlantUpdate(plant_id=item.plant_id, asset_id=asset.id)
+        session.add(item.update)
+        await fan_out_update(item.update, current_user.id, session)
+
+        # update plant with new asset
+        plant = plants[item.plant_id]
+        plant.asset_id = asset.id
+        session.add(plant)
+
+    await session.commit()
+
+    if unused:
+        # once the response is sent, a failure only leaves orphans for the storage gc
+        background_tasks.add_task(_remove_unused, unused)
+
+    return [
+        BatchUpdateResult(
+            index=item.index,
+            plant_id=item.plant_id,
+            status_code=item.error.status_code if item.error is not None else status.HTTP_200_OK,
+            update=item.update,
+            detail=item.error.detail if item.error is not None else None,
+        )
+        for item in items
+    ]
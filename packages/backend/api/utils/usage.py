@@ -1,19 +1,85 @@
-from sqlmodel import Session, select
+import uuid
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from core.settings import settings
 from models.tables.asset import Asset
+from models.tables.user_usage import UserUsage
 from models.usage import Usage
 from models.tables.user import User
 
-def get_user_usage(user: User, session: Session) -> Usage:
-    statement = (select(Asset)
-                 .where(Asset.author == user.id)
+
+def _usage_aggregate(user_id: uuid.UUID | None = None):
+    statement = (select(User.id, func.coalesce(func.sum(Asset.asset_size), 0))
+                 .join(Asset, onclause=(Asset.author == User.id), isouter=True)
+                 .group_by(User.id)
                  )
+    if user_id is not None:
+        statement = statement.where(User.id == user_id)
+    return statement
+
+
+async def reconcile_usage(session: AsyncSession) -> int:
+    """
+    Recompute the whole usage ledger from the asset table with a single aggregate.
+    Returns the number of ledger rows written.
+    """
+    statement = insert(UserUsage).from_select(
+        ["user_id", "asset_size_sum"],
+        _usage_aggregate(),
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[UserUsage.user_id],
+        set_={"asset_size_sum": statement.excluded.asset_size_sum},
+    ).returning(UserUsage.user_id)
+    result = await session.exec(statement)
+    return len(result.all())
+
+
+async def _seed_usage(user_id: uuid.UUID, session: AsyncSession) -> None:
+    # only creates a missing row: an existing one may already hold uncommitted reservations
+    statement = insert(UserUsage).from_select(
+        ["user_id", "asset_size_sum"],
+        _usage_aggregate(user_id),
+    ).on_conflict_do_nothing(index_elements=[UserUsage.user_id])
+    await session.exec(statement)
+
 
-    results = session.exec(statement)
+async def get_user_usage(user: User, session: AsyncSession) -> Usage:
+    statement = select(UserUsage.asset_size_sum).where(UserUsage.user_id == user.id)
+    asset_size_sum = (await session.exec(statement)).first()
 
-    asset_size_sum = 0
-    for asset in results:
-        asset_size_sum = asset_size_sum + asset.asset_size
+    # users who have no ledger row yet (e.g. created before it existed) get it seeded from their assets
+    if asset_size_sum is None:
+        await _seed_usage(user.id, session)
+        asset_size_sum = (await session.exec(statement)).one()
 
-    return Usage(asset_size_sum=asset_size_sum, asset_size_limit=settings.MAX_SUM_STORAGE)
\ No newline at end of file
+    return Usage(asset_size_sum=asset_size_sum, asset_size_limit=settings.MAX_SUM_STORAGE)
+
+
+async def reserve_usage(user_id: uuid.UUID, size: int, session: AsyncSession) -> bool:
+    """
+    Atomically add size to the user's usage if it stays within MAX_SUM_STORAGE.
+    The conditional upsert locks the ledger row until the caller's transaction ends,
+    so two concurrent uploads cannot both pass the check.
+    """
+    statement = insert(UserUsage).values(user_id=user_id, asset_size_sum=size)
+    statement = statement.on_conflict_do_update(
+        index_elements=[UserUsage.user_id],
+        set_={"asset_size_sum": UserUsage.asset_size_sum + statement.excluded.asset_size_sum},
+        where=(UserUsage.asset_size_sum + statement.excluded.asset_size_sum <= settings.MAX_SUM_STORAGE),
+    ).returning(UserUsage.asset_size_sum)
+
+    result = await session.exec(statement)
+    return result.first() is not None
+
+
+async def release_usage(user_id: uuid.UUID, size: int, session: AsyncSession) -> None:
+    statement = (update(UserUsage)
+                 .where(UserUsage.user_id == user_id)
+                 .values(asset_size_sum=func.greatest(UserUsage.asset_size_sum - size, 0))
+                 )
+    await session.exec(statement)
@@ -0,0 +1,123 @@
+import asyncio
+import io
+from enum import Enum
+
+from fastapi import HTTPException
+from minio.error import S3Error
+from starlette import status
+
+from core import metrics
+from core.cache import TTLCache
+from core.images import InvalidImageError, resize_image
+from core.storage import AsyncStorage
+from models.tables.asset import Asset
+
+
+class ImageVariant(str, Enum):
+    AVATAR = "avatar"
+    THUMBNAIL = "thumbnail"
+    MEDIUM = "medium"
+
+VARIANT_WIDTHS: dict[ImageVariant, int] = {
+    ImageVariant.AVATAR: 64,
+    ImageVariant.THUMBNAIL: 256,
+    ImageVariant.MEDIUM: 1024,
+}
+
+# ?w= is rounded up to one of these so that a handful of variants exist per asset
+WIDTHS: list[int] = [64, 128, 256, 512, 1024]
+
+# variants known to exist in the bucket (saves a stat per request)
+_stored_variants: TTLCache[str, bool] = TTLCache(maxsize=100_000, ttl=60 * 60)
+metrics.register_cache("stored_variant", _stored_variants)
+# variants which cannot be generated (original missing or not decodable): status code and detail to answer
+# for a while instead of downloading and decoding the original again
+_failed_variants: TTLCache[str, tuple[int, str]] = TTLCache(maxsize=10_000, ttl=60)
+metrics.register_cache("failed_variant", _failed_variants)
+# variants being generated, concurrent requests for the same one wait on the same task
+_pending: dict[str, asyncio.Task] = {}
+
+
+def resolve_width(w: int | None, variant: ImageVariant | None) -> int | None:
+    """
+    Width of the variant to serve, None for the original.
+    """
+    if w is not None and variant is not None:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Use either w or variant"
+        )
+
+    if variant is not None:
+        return VARIANT_WIDTHS[variant]
+
+    if w is not None:
+        # larger than every variant: the original is the best match
+        return next((width for width in WIDTHS if width >= w), None)
+
+    return None
+
+
+def variant_object_name(asset: Asset, width: int) -> str:
+    return f"{asset.id}/w{width}"
+
+
+def variant_object_names(asset: Asset) -> list[str]:
+    return [variant_object_name(asset, width) for width in WIDTHS]
+
+
+async def _generate_variant(storage: AsyncStorage, asset: Asset, width: int, object_name: str) -> None:
+    try:
+        original = await storage.read_object(str(asset.id))
+        resized = await resize_image(original, width)
+    except S3Error:
+        failure = (status.HTTP_404_NOT_FOUND, "Image not found")
+    except InvalidImageError:
+        failure = (status.HTTP_422_UNPROCESSABLE_ENTITY, "The image cannot be decoded")
+    else:
+        failure = None
+    if failure is not None:
+        # once for all the requests waiting on this generation
+        _failed_variants.set(object_name, failure)
+        raise HTTPException(status_code=failure[0], detail=failure[1])
+
+    await storage.put_object(
+        object_name=object_name,
+        data=io.BytesIO(resized),
+        length=len(resized),
+        content_type=asset.asset_type.value,
+    )
+
+
+async def ensure_variant(storage: AsyncStorage, asset: Asset, width: int) -> str:
+    """
+    Returns the object name of the variant, generating and storing it on first request.
+    """
+    object_name = variant_object_name(asset, width)
+    if _stored_variants.get(object_name):
+        return object_name
+
+    failure = _failed_variants.get(object_name)
+    if failure is not None:
+        raise HTTPException(status_code=failure[0], detail=failure[1])
+
+    task = _pending.get(object_name)
+    if task is None:
+        try:
+            await storage.stat_object(object_name)
+            _stored_variants.set(object_name, True)
+            return object_name
+        except S3Error:
+            pass
+
+        # another request may have started it while we were checking the bucket
+        task = _pending.get(object_name)
+        if task is None:
+            task = asyncio.create_task(_generate_variant(storage, asset, width, object_name))
+            _pending[object_name] = task
+            task.add_done_callback(lambda _: _pending.pop(object_name, None))
+
+    # shield: a client going away must not cancel the generation other requests wait on
+    await asyncio.shield(task)
+    _stored_variants.set(object_name, True)
+    return object_name
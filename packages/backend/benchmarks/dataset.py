@@ -0,0 +1,91 @@
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+# Generated datasets of the benchmarks and of commands/check_query_plans.py: lists of statements run
+# in order with the caller's parameters, filling temporary bench_* tables then the real ones.
+# Every row belongs to a bench user (usernames start with :tag): CLEANUP removes any dataset.
+
+# :users users, numbered n
+BENCH_USER = """CREATE TEMP TABLE bench_user AS
+    SELECT i AS n, gen_random_uuid() AS id FROM generate_series(0, :users - 1) AS i"""
+
+USERS = [
+    BENCH_USER,
+    """INSERT INTO "user" (id, email, username, password_hash)
+       SELECT id, :tag || n || '@bench.invalid', :tag || n, '!' FROM bench_user""",
+]
+
+# every user follows the next :followees users (wrapping around), the last :pending of them are still requests
+FOLLOW_RING = [
+    """INSERT INTO follower (from_user, to_user, created_at, status)
+       SELECT a.id, b.id, now(), (CASE WHEN k > :followees - :pending THEN 'PENDING' ELSE 'APPROVED' END)::followstatus
+       FROM bench_user AS a
+       CROSS JOIN generate_series(1, :followees) AS k
+       JOIN bench_user AS b ON b.n = (a.n + k) % :users""",
+]
+
+# a plant per user
+PLANTS = [
+    """CREATE TEMP TABLE bench_plant AS
+       SELECT gen_random_uuid() AS id, id AS owner, NULL::uuid AS parent_id FROM bench_user""",
+]
+
+# a cutting of every plant, between PLANTS and UPDATES
+CUTTINGS = [
+    """INSERT INTO bench_plant SELECT gen_random_uuid(), owner, id FROM bench_plant""",
+]
+
+# the plant rows, :updates updates per plant within the feed window (an asset each, whose content is
+# its id as text), and the timeline entries publish_update fans out on write
+UPDATES = [
+    """CREATE TEMP TABLE bench_update AS
+       SELECT gen_random_uuid() AS id, gen_random_uuid() AS asset_id, p.id AS plant_id, p.owner,
+              localtimestamp - random() * interval '23 hours' AS created_at
+       FROM bench_plant AS p CROSS JOIN generate_series(1, :updates)""",
+    """INSERT INTO asset (id, author, asset_etag, asset_size, content_hash, asset_type, asset_visibility)
+       SELECT asset_id, owner, md5(asset_id::text), 1024, encode(sha256(convert_to(asset_id::text, 'UTF8')), 'hex'),
+              'IMAGE_JPEG', 'PRIVATE'
+       FROM bench_update""",
+    """INSERT INTO plant (id, owner, name, created_at, updated_at, dead, parent_id)
+       SELECT id, owner, 'bench', localtimestamp, localtimestamp, false, parent_id FROM bench_plant""",
+    """INSERT INTO plantupdate (id, plant_id, created_at, asset_id)
+       SELECT id, plant_id, created_at, asset_id FROM bench_update""",
+    """INSERT INTO timelineentry (user_id, update_id, created_at, author, asset_id)
+       SELECT f.from_user, u.id, u.created_at, u.owner, u.asset_id
+       FROM bench_update AS u JOIN follower AS f ON f.to_user = u.owner AND f.status = 'APPROVED'""",
+]
+
+# everything the bench users own, whatever the dataset (and the rows the api wrote for them meanwhile)
+CLEANUP = [
+    "DELETE FROM timelineentry WHERE user_id IN (SELECT id FROM bench_user)",
+    """DELETE FROM plantupdate WHERE plant_id IN (
+           SELECT id FROM plant WHERE owner IN (SELECT id FROM bench_user))""",
+    "DELETE FROM plant WHERE owner IN (SELECT id FROM bench_user)",
+    "DELETE FROM asset WHERE author IN (SELECT id FROM bench_user)",
+    """DELETE FROM follower WHERE from_user IN (SELECT id FROM bench_user)
+           OR to_user IN (SELECT id FROM bench_user)""",
+    "DELETE FROM userusage WHERE user_id IN (SELECT id FROM bench_user)",
+    """DELETE FROM "user" WHERE id IN (SELECT id FROM bench_user)""",
+]
+
+
+async def populate(conn: AsyncConnection, statements: list[str], params: dict[str, object]) -> float:
+    """
+    Run the statements, commit, and refresh the planner statistics. Returns the seconds it took.
+    """
+    start = time.perf_counter()
+    for statement in statements:
+        await conn.execute(text(statement), params)
+    await conn.commit()
+    await conn.execute(text("ANALYZE"))
+    return time.perf_counter() - start
+
+
+async def cleanup(conn: AsyncConnection) -> None:
+    # the transaction may have been aborted by a failed measure
+    await conn.rollback()
+    for statement in CLEANUP:
+        await conn.execute(text(statement))
+    await conn.commit()
@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from sqlalchemy import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from api.utils.pagination import keyset_paginate
+from api.utils.timeline import fan_out_on_read_statement, timeline_statement
+from models.tables.plant_update import PlantUpdate
+from models.tables.timeline_entry import TimelineEntry
+from benchmarks.dataset import FOLLOW_RING, PLANTS, UPDATES, USERS, cleanup, populate
+from benchmarks.stats import percentile
+from core.db import engine, init_db
+
+# Compares the fan-out-on-read feed query with the materialized timeline read.
+# Writes its own rows (tagged users) into the configured database, use a scratch database.
+# usage: python -m benchmarks.feed_strategies --users 10000 --followees 500 (from packages/backend)
+
+POPULATE = USERS + FOLLOW_RING + PLANTS + UPDATES
+
+# first page of the feed, as served by GET /feed/
+PAGE_SIZE = 20
+
+def fan_out_on_read_page(user_id: uuid.UUID):
+    return keyset_paginate(fan_out_on_read_statement(user_id), PlantUpdate.created_at, PlantUpdate.id, None, PAGE_SIZE)
+
+
+def timeline_page(user_id: uuid.UUID):
+    return keyset_paginate(timeline_statement(user_id), TimelineEntry.created_at, TimelineEntry.update_id, None, PAGE_SIZE)
+
+
+async def measure(label: str, build_statement, user_ids: list[uuid.UUID]) -> None:
+    samples: list[float] = []
+    rows = 0
+    async with AsyncSession(engine) as session:
+        for user_id in user_ids:
+            start = time.perf_counter()
+            rows += len((await session.exec(build_statement(user_id))).all())
+            samples.append((time.perf_counter() - start) * 1000)
+
+    print(f"{label:<18} p50={statistics.median(samples):8.2f}ms "
+          f"p95={percentile(samples, 95):8.2f}ms p99={percentile(samples, 99):8.2f}ms "
+          f"avg rows={rows / len(user_ids):.0f}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="fan-out-on-read vs materialized timeline feed")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--followees", type=int, default=500)
+    parser.add_argument("--updates", type=int, default=2, help="updates per user within the feed window")
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--keep", action="store_true", help="do not delete the generated rows")
+    args = parser.parse_args()
+
+    await init_db()
+
+    params = {
+        "users": args.users,
+        "followees": min(args.followees, args.users - 1),
+        "pending": 0,
+        "updates": args.updates,
+        "tag": f"b{uuid.uuid4().hex[:6]}_",
+    }
+
+    async with engine.connect() as conn:
+        print(f"populated in {await populate(conn, POPULATE, params):.1f}s")
+
+        sample = (await conn.execute(
+            text("SELECT id FROM bench_user ORDER BY random() LIMIT :samples"), {"samples": args.samples}
+        )).scalars().all()
+
+        try:
+            await measure("fan-out on read", fan_out_on_read_page, sample)
+            await measure("timeline", timeline_page, sample)
+        finally:
+            if not args.keep:
+                await cleanup(conn)
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from sqlalchemy import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from api.routes.feed import FeedItem, get_feed
+from api.routes.plants import get_plants
+from api.utils.fast_json import page_response, select_rows
+from benchmarks.dataset import USERS, cleanup, populate
+from core.db import engine, init_db
+from core.settings import settings
+from models.page import Page
+from models.tables.plant import Plant
+from models.tables.user import User
+
+# Cost per item of a list response, with FastAPI validating and serializing the response model,
+# and with FAST_JSON_RESPONSES (column rows written by orjson). The route functions are called
+# directly, followed by what FastAPI does with their result.
+# Writes its own rows (tagged users) into the configured database, use a scratch database.
+# usage: python -m benchmarks.json_responses --items 200 (from packages/backend)
+
+POPULATE = USERS + [
+    # user 0 owns the plants, user 1 follows user 0 and gets their updates in the feed
+    """CREATE TEMP TABLE bench_asset AS SELECT gen_random_uuid() AS id""",
+    """INSERT INTO asset (id, author, asset_etag, asset_size, asset_type, asset_visibility, refcount)
+       SELECT a.id, u.id, repeat('0', 32), 1, 'IMAGE_JPEG', 'PRIVATE', :items
+       FROM bench_asset AS a, bench_user AS u WHERE u.n = 0""",
+    """CREATE TEMP TABLE bench_plant AS
+       SELECT i AS n, gen_random_uuid() AS id, gen_random_uuid() AS update_id,
+              now() - i * interval '1 second' AS created_at
+       FROM generate_series(0, :items - 1) AS i""",
+    """INSERT INTO plant (id, owner, name, created_at, updated_at, dead, asset_id)
+       SELECT p.id, u.id, 'bench ' || p.n, p.created_at, p.created_at, false, (SELECT id FROM bench_asset)
+       FROM bench_plant AS p, bench_user AS u WHERE u.n = 0""",
+    """INSERT INTO plantupdate (id, plant_id, created_at, asset_id)
+       SELECT update_id, id, created_at, (SELECT id FROM bench_asset) FROM bench_plant""",
+    """INSERT INTO timelineentry (user_id, update_id, created_at, author, asset_id)
+       SELECT v.id, p.update_id, p.created_at, o.id, (SELECT id FROM bench_asset)
+       FROM bench_plant AS p, bench_user AS v, bench_user AS o WHERE v.n = 1 AND o.n = 0""",
+]
+
+PLANTS_FIELD = create_model_field("response", Page[Plant], mode="serialization")
+FEED_FIELD = create_model_field("response", Page[FeedItem], mode="serialization")
+
+
+async def to_body(result, field) -> bytes:
+    # a response class is sent as is, a model goes through the response model like in fastapi's routing
+    if settings.FAST_JSON_RESPONSES:
+        return result.body
+    return await serialize_response(field=field, response_content=result, dump_json=True)
+
+
+async def measure(label: str, run, items: int, repeat: int) -> None:
+    samples: list[float] = []
+    size = 0
+    for fast in (False, True):
+        settings.FAST_JSON_RESPONSES = fast
+        samples.clear()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            size = len(await run())
+            samples.append((time.perf_counter() - start) * 1_000_000 / items)
+        mode = "orjson rows" if fast else "response model"
+        print(f"{label:<30} {mode:<15} {statistics.median(samples):8.2f}us/item (min {min(samples):8.2f}) "
+              f"{size} bytes")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="list response cost per item: response model vs orjson rows")
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    await init_db()
+
+    params = {"users": 2, "items": args.items, "tag": f"b{uuid.uuid4().hex[:6]}_"}
+
+    async with engine.connect() as conn:
+        await populate(conn, POPULATE, params)
+
+        try:
+            owner_id, viewer_id = (await conn.execute(text("SELECT id FROM bench_user ORDER BY n"))).scalars().all()
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                owner = await session.get(User, owner_id)
+                viewer = await session.get(User, viewer_id)
+
+                async def plants_route() -> bytes:
+                    result = await get_plants(current_user=owner, session=session, user_id=None, cursor=None,
+                                              limit=args.items)
+                    return await to_body(result, PLANTS_FIELD)
+
+                async def feed_route() -> bytes:
+                    result = await get_feed(current_user=viewer, session=session, cursor=None, limit=args.items)
+                    return await to_body(result, FEED_FIELD)
+
+                # the rows are fetched once per mode, only their serialization is timed
+                rows = {}
+                for fast in (False, True):
+                    settings.FAST_JSON_RESPONSES = fast
+                    statement = select_rows(Plant).where(Plant.owner == owner_id).limit(args.items)
+                    rows[fast] = (await session.exec(statement)).all()
+
+                async def plants_serialization() -> bytes:
+                    return await to_body(page_response(rows[settings.FAST_JSON_RESPONSES], None), PLANTS_FIELD)
+
+                await measure("plants: serialization only", plants_serialization, args.items, args.repeat)
+                await measure("plants: query + serialization", plants_route, args.items, args.repeat)
+                await measure("feed: query + serialization", feed_route, args.items, args.repeat)
+        finally:
+            await cleanup(conn)
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
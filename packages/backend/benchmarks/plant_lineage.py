@@ -0,0 +1,97 @@
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from sqlalchemy import text
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from api.utils.follow_graph import is_approved_follower
+from api.utils.lineage import lineage_statement
+from benchmarks.dataset import USERS, cleanup, populate
+from core.db import engine, init_db
+from models.tables.plant import Plant
+
+# Reads a whole propagation tree with the recursive lineage query, and the way a client had to
+# before: one /cuttings/ request (a permission check and a children query) per node.
+# Writes its own rows (tagged users) into the configured database, use a scratch database.
+# usage: python -m benchmarks.plant_lineage --nodes 5000 --branching 3 (from packages/backend)
+
+POPULATE = USERS + [
+    # user 1 looks at the plants of user 0
+    """INSERT INTO follower (from_user, to_user, created_at, status)
+       SELECT b.id, a.id, now(), 'APPROVED' FROM bench_user AS a, bench_user AS b WHERE a.n = 0 AND b.n = 1""",
+    # a complete tree in heap order: the parent of node n is node (n - 1) / branching
+    """CREATE TEMP TABLE bench_plant AS
+       SELECT i AS n, gen_random_uuid() AS id FROM generate_series(0, :nodes - 1) AS i""",
+    """INSERT INTO plant (id, owner, name, created_at, updated_at, dead, parent_id)
+       SELECT p.id, (SELECT id FROM bench_user WHERE n = 0), 'bench', localtimestamp, localtimestamp, false, parent.id
+       FROM bench_plant AS p LEFT JOIN bench_plant AS parent ON p.n > 0 AND parent.n = (p.n - 1) / :branching""",
+]
+
+async def lineage(plant_id: uuid.UUID, user_id: uuid.UUID, depth: int) -> int:
+    async with AsyncSession(engine) as session:
+        return len((await session.exec(lineage_statement(plant_id, user_id, depth))).all())
+
+
+async def walk(plant_id: uuid.UUID, user_id: uuid.UUID, depth: int) -> int:
+    # what GET /cuttings/{plant_id} does, for every node of the tree
+    async with AsyncSession(engine) as session:
+        count = 1
+        generation = [plant_id]
+        for _ in range(depth):
+            next_generation = []
+            for parent_id in generation:
+                parent = await session.get(Plant, parent_id)
+                await is_approved_follower(user_id, parent.owner, session)
+                children = (await session.exec(select(Plant.id).where(Plant.parent_id == parent_id))).all()
+                next_generation += children
+            count += len(next_generation)
+            generation = next_generation
+        return count
+
+
+async def measure(label: str, run, repeat: int) -> None:
+    samples: list[float] = []
+    nodes = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        nodes = await run()
+        samples.append((time.perf_counter() - start) * 1000)
+    print(f"{label:<28} nodes={nodes:<6} median={statistics.median(samples):9.2f}ms min={min(samples):9.2f}ms")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="recursive lineage query vs walking the tree")
+    parser.add_argument("--nodes", type=int, default=5000)
+    parser.add_argument("--branching", type=int, default=3)
+    parser.add_argument("--depth", type=int, default=100, help="depth limit of the lineage query")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    await init_db()
+
+    params = {"users": 2, "nodes": args.nodes, "branching": args.branching, "tag": f"b{uuid.uuid4().hex[:6]}_"}
+
+    async with engine.connect() as conn:
+        await populate(conn, POPULATE, params)
+
+        try:
+            viewer = (await conn.execute(text("SELECT id FROM bench_user WHERE n = 1"))).scalar()
+            root, leaf = (await conn.execute(
+                text("SELECT id FROM bench_plant WHERE n IN (0, :last) ORDER BY n"), {"last": args.nodes - 1}
+            )).scalars().all()
+
+            await measure("lineage from the root", lambda: lineage(root, viewer, args.depth), args.repeat)
+            await measure("lineage from a leaf", lambda: lineage(leaf, viewer, args.depth), args.repeat)
+            await measure("walk, request per node", lambda: walk(root, viewer, args.depth), args.repeat)
+        finally:
+            await cleanup(conn)
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
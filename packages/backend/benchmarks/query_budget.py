@@ -0,0 +1,115 @@
+import asyncio
+import io
+import sys
+import uuid
+
+import httpx
+from PIL import Image
+
+from core.query_budget import assert_max_queries
+from main import app
+
+# Statements per endpoint, to catch regressions in query counts: the app runs in process (its lifespan
+# included) and every request of a fixed scenario goes through assert_max_queries. The counts include
+# the authentication of the request (the user row is cached, see api/dependencies/current_user.py) and
+# the background tasks. Lower a budget when an endpoint gets cheaper, never raise one without a reason.
+# Writes its own users into the configured database, and needs the object storage: use scratch ones.
+# usage: python -m benchmarks.query_budget (from packages/backend), exits 1 when a budget is exceeded
+
+BUDGETS: dict[str, int] = {
+    "create user": 1,
+    "login": 1,
+    "me": 1,
+    # the first upload of a user also computes their usage row
+    "create plant": 10,
+    "create cutting": 9,
+    "add update": 8,
+    "follow": 4,
+    "follow status": 1,
+    "pending followers": 1,
+    "approve": 3,
+    "feed": 1,
+    "plants of a user": 1,
+    "plant": 1,
+    "updates": 2,
+    "cuttings": 2,
+    "asset": 1,
+    "delete update": 8,
+    "delete plant": 7,
+}
+
+
+def jpeg(color: str) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+class Scenario:
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.failures: list[str] = []
+
+    async def call(self, label: str, method: str, url: str, **kwargs) -> httpx.Response:
+        try:
+            with assert_max_queries(BUDGETS[label], label) as stats:
+                response = await self.client.request(method, url, **kwargs)
+        except AssertionError as e:
+            self.failures.append(str(e))
+        response.raise_for_status()
+        print(f"{label:<20} {stats.count:3d} queries (budget {BUDGETS[label]:3d}) {stats.duration * 1000:7.2f}ms")
+        return response
+
+    async def user(self, name: str) -> tuple[dict[str, str], str]:
+        username = f"{name}{uuid.uuid4().hex[:8]}"
+        response = await self.call("create user", "POST", "/users/create", json={
+            "email": f"{username}@example.com",
+            "username": username,
+            "password": "password",
+        })
+        await self.call("login", "POST", "/users/login", json={"username": username, "password": "password"})
+        return {"Authorization": f"Bearer {response.json()['token']['access_token']}"}, response.json()["user_id"]
+
+    async def run(self) -> None:
+        alice, alice_id = await self.user("alice")
+        bob, bob_id = await self.user("bob")
+        await self.call("me", "GET", "/users/me", headers=alice)
+
+        plant = (await self.call("create plant", "POST", "/plants/", headers=alice, data={"name": "fern"},
+                                 files={"image": ("a.jpg", jpeg("green"), "image/jpeg")})).json()
+        await self.call("create cutting", "POST", "/plants/", headers=alice,
+                        data={"name": "cutting", "parent_id": plant["id"]},
+                        files={"image": ("b.jpg", jpeg("olive"), "image/jpeg")})
+        await self.call("add update", "POST", f"/updates/{plant['id']}", headers=alice,
+                        files={"image": ("c.jpg", jpeg("lime"), "image/jpeg")})
+
+        await self.call("follow", "POST", f"/followings/request/{alice_id}", headers=bob)
+        await self.call("follow status", "GET", f"/followings/request/{alice_id}/status", headers=bob)
+        await self.call("pending followers", "GET", "/followers/pending", headers=alice)
+        await self.call("approve", "POST", f"/followers/{bob_id}/approve", headers=alice)
+
+        await self.call("feed", "GET", "/feed/", headers=bob)
+        await self.call("plants of a user", "GET", "/plants/", headers=bob, params={"user_id": alice_id})
+        await self.call("plant", "GET", f"/plants/{plant['id']}", headers=bob)
+        updates = (await self.call("updates", "GET", f"/updates/{plant['id']}", headers=bob)).json()["items"]
+        await self.call("cuttings", "GET", f"/cuttings/{plant['id']}", headers=bob)
+        await self.call("asset", "GET", f"/assets/{plant['asset_id']}", headers=bob)
+
+        await self.call("delete update", "DELETE", f"/updates/{plant['id']}/{updates[0]['id']}", headers=alice)
+        await self.call("delete plant", "DELETE", f"/plants/{plant['id']}", headers=alice)
+
+
+async def main() -> None:
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver/api/v1") as client:
+            scenario = Scenario(client)
+            await scenario.run()
+
+    if scenario.failures:
+        print("\n".join(scenario.failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,10 @@
+# Shared by the benchmarks and the load scripts of the repository's scripts/ directory, which import
+# this module by path: keep it free of any dependency.
+
+
+def percentile(samples: list[float], q: float) -> float:
+    """
+    Nearest-rank percentile (q in 0..100) of a non-empty list.
+    """
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
@@ -0,0 +1,81 @@
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from sqlalchemy import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from api.utils.search import search_users
+from benchmarks.dataset import BENCH_USER, cleanup, populate
+from benchmarks.stats import percentile
+from core.db import engine, init_db
+
+# Autocomplete latency of GET /users/search, on a table of generated users.
+# Writes its own rows (tagged users) into the configured database, use a scratch database.
+# usage: python -m benchmarks.user_search --users 1000000 (from packages/backend)
+
+POPULATE = [
+    BENCH_USER,
+    # usernames look like 'b1a2b3_4f0c2a9e1d7b55': a shared tag, then pseudo random hex
+    """INSERT INTO "user" (id, email, username, password_hash)
+       SELECT id, :tag || n || '@bench.invalid', :tag || substr(md5(n::text), 1, 14), '!' FROM bench_user""",
+]
+
+# what the search box sends, keystroke after keystroke
+SEARCH_LIMIT = 10
+
+
+async def measure(label: str, patterns: list[str], current_user_id: uuid.UUID) -> None:
+    samples: list[float] = []
+    rows = 0
+    async with AsyncSession(engine) as session:
+        for pattern in patterns:
+            start = time.perf_counter()
+            rows += len(await search_users(current_user_id, pattern, SEARCH_LIMIT, session))
+            samples.append((time.perf_counter() - start) * 1000)
+
+    print(f"{label:<12} p50={statistics.median(samples):8.2f}ms "
+          f"p95={percentile(samples, 95):8.2f}ms p99={percentile(samples, 99):8.2f}ms "
+          f"avg rows={rows / len(patterns):.1f}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="user search latency")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--keep", action="store_true", help="do not delete the generated rows")
+    args = parser.parse_args()
+
+    await init_db()
+
+    tag = f"b{uuid.uuid4().hex[:6]}_"
+    params = {"users": args.users, "tag": tag}
+
+    async with engine.connect() as conn:
+        print(f"populated in {await populate(conn, POPULATE, params):.1f}s")
+
+        usernames = (await conn.execute(
+            text("""SELECT u.id, u.username FROM bench_user JOIN "user" AS u USING (id)
+                    ORDER BY random() LIMIT :samples"""),
+            {"samples": args.samples},
+        )).all()
+        current_user_id = usernames[0].id
+        hashes = [username.removeprefix(tag) for _, username in usernames]
+
+        try:
+            # the whole username, the start of one, the middle of one, something no one has
+            await measure("exact", [tag + h for h in hashes], current_user_id)
+            await measure("prefix", [tag + h[:3] for h in hashes], current_user_id)
+            await measure("substring", [h[3:7] for h in hashes], current_user_id)
+            await measure("no match", [h[::-1] + "zz" for h in hashes], current_user_id)
+        finally:
+            if not args.keep:
+                await cleanup(conn)
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,196 @@
+import argparse
+import asyncio
+import base64
+import json
+import re
+import sys
+import uuid
+from datetime import timedelta
+
+import httpx
+from sqlalchemy import event, text
+
+from benchmarks.dataset import CUTTINGS, FOLLOW_RING, PLANTS, UPDATES, USERS, cleanup, populate
+from core.db import engine, init_db
+from core.security import create_access_token
+from main import app
+
+# Walks the read then the write endpoints over a generated dataset, records every query they issue,
+# and EXPLAINs each of them: fails when a plan sequentially scans a large table (a missing index).
+# Writes its own rows (tagged users) into the configured database, use a scratch database.
+# Does not need MinIO: assets are requested with If-None-Match, answered before any storage call,
+# the writes only publish images already stored, and the objects of the assets they free are
+# removed in the background, after the response.
+# usage: python -m commands.check_query_plans (from packages/backend)
+
+# the last request of every user is still pending, every plant has a cutting
+POPULATE = USERS + FOLLOW_RING + PLANTS + CUTTINGS + UPDATES
+
+# statements worth explaining (not BEGIN, COMMIT, ...)
+EXPLAINABLE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+
+
+async def walk_routes(
+        client: httpx.AsyncClient,
+        followee: uuid.UUID,
+        plant_id: uuid.UUID,
+        asset_id: uuid.UUID,
+        tag: str,
+) -> None:
+    """
+    Every read endpoint, as a user looking at one of its followees' plant.
+    """
+    async def get(url: str, **kwargs) -> httpx.Response:
+        response = await client.get(url, **kwargs)
+        print(f"  GET {url} -> {response.status_code}")
+        return response
+
+    await get("/users/me")
+    await get("/users/search", params={"pattern": f"{tag}1"})
+    await get("/users/usage")
+    await get("/followers/pending")
+    await get(f"/followings/request/{followee}/status")
+
+    for url, params in [
+        ("/plants/", {}),
+        ("/plants/", {"user_id": str(followee)}),
+        (f"/updates/{plant_id}", {"limit": 1}),
+        (f"/cuttings/{plant_id}", {"limit": 1}),
+        ("/feed/", {"limit": 5}),
+    ]:
+        # first page, then the next one
+        response = await get(url, params=params)
+        next_cursor = response.json().get("next_cursor") if response.status_code == 200 else None
+        if next_cursor is not None:
+            await get(url, params={**params, "cursor": next_cursor})
+
+    await get(f"/plants/{plant_id}")
+    await get(f"/assets/{asset_id}", headers={"If-None-Match": "*"})
+    await get(f"/avatars/avatar/{followee}", headers={"If-None-Match": "*"})
+
+
+async def walk_writes(
+        client: httpx.AsyncClient,
+        plant_id: uuid.UUID,
+        cutting_id: uuid.UUID,
+        content_hash: str,
+) -> None:
+    """
+    The write endpoints, as a user on its own plant and its cutting. The image published is the one
+    of the cutting, sent by digest: a new reference to its asset, fanned out to the followers.
+    """
+    async def send(method: str, url: str, **kwargs) -> httpx.Response:
+        response = await client.request(method, url, **kwargs)
+        print(f"  {method} {url} -> {response.status_code}")
+        return response
+
+    digest = base64.b64encode(bytes.fromhex(content_hash)).decode()
+    publish = {"headers": {"Content-Type": "image/jpeg", "Repr-Digest": f"sha-256=:{digest}:"}, "content": b""}
+
+    # published then deleted: the plant shows its previous update again
+    await send("POST", f"/updates/{plant_id}/stream", **publish)
+    response = await send("GET", f"/updates/{plant_id}", params={"limit": 1})
+    if response.status_code == 200 and response.json()["items"]:
+        await send("DELETE", f"/updates/{plant_id}/{response.json()['items'][0]['id']}")
+
+    # published again, then the cutting goes: this asset keeps a reference, its other ones are freed
+    await send("POST", f"/updates/{plant_id}/stream", **publish)
+    await send("DELETE", f"/plants/{cutting_id}")
+
+
+def sequential_scans(plan: dict) -> list[str]:
+    relations = [plan["Relation Name"]] if plan["Node Type"] == "Seq Scan" else []
+    for child in plan.get("Plans", []):
+        relations += sequential_scans(child)
+    return relations
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="EXPLAIN every query of the read and write endpoints")
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--followees", type=int, default=10)
+    parser.add_argument("--updates", type=int, default=2, help="updates per plant")
+    parser.add_argument("--min-rows", type=int, default=10_000, help="tables smaller than this may be scanned")
+    parser.add_argument("--keep", action="store_true", help="do not delete the generated rows")
+    args = parser.parse_args()
+
+    await init_db()
+
+    tag = f"b{uuid.uuid4().hex[:6]}_"
+    params = {
+        "users": args.users,
+        "followees": min(args.followees, args.users - 1),
+        "pending": 1,
+        "updates": args.updates,
+        "tag": tag,
+    }
+
+    failures = 0
+    async with engine.connect() as conn:
+        await populate(conn, POPULATE, params)
+
+        try:
+            user_id, followee = (await conn.execute(
+                text("SELECT id FROM bench_user WHERE n IN (0, 1) ORDER BY n")
+            )).scalars().all()
+            plant_id, asset_id = (await conn.execute(text(
+                """SELECT p.id, u.asset_id FROM bench_plant AS p JOIN bench_update AS u ON u.plant_id = p.id
+                   WHERE p.owner = :owner AND p.parent_id IS NULL LIMIT 1"""
+            ), {"owner": followee})).one()
+            own_plant_id, cutting_id, content_hash = (await conn.execute(text(
+                """SELECT p.id, c.id, a.content_hash FROM bench_plant AS p
+                   JOIN bench_plant AS c ON c.parent_id = p.id
+                   JOIN bench_update AS u ON u.plant_id = c.id
+                   JOIN asset AS a ON a.id = u.asset_id
+                   WHERE p.owner = :owner LIMIT 1"""
+            ), {"owner": user_id})).one()
+            table_rows = dict((await conn.execute(
+                text("SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'")
+            )).all())
+
+            # record what the routes send to the database
+            recorded: dict[str, object] = {}
+
+            def record(_conn, _cursor, statement, parameters, _context, _executemany) -> None:
+                if EXPLAINABLE.match(statement):
+                    recorded.setdefault(statement, parameters)
+
+            event.listen(engine.sync_engine, "before_cursor_execute", record)
+            token = create_access_token(user_id=user_id, expires_delta=timedelta(minutes=5))
+            async with httpx.AsyncClient(
+                    transport=httpx.ASGITransport(app=app, raise_app_exceptions=False),
+                    base_url="http://check/api/v1",
+                    headers={"Authorization": f"Bearer {token}"},
+            ) as client:
+                await walk_routes(client, followee, plant_id, asset_id, tag)
+                await walk_writes(client, own_plant_id, cutting_id, content_hash)
+            event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+            print(f"\n{len(recorded)} distinct queries")
+            for statement, parameters in recorded.items():
+                plan = (await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)).scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                scanned = [
+                    relation for relation in sequential_scans(plan[0]["Plan"])
+                    if table_rows.get(relation, 0) >= args.min_rows
+                ]
+                summary = " ".join(statement.split())[:140]
+                if scanned:
+                    failures += 1
+                    print(f"SEQ SCAN on {', '.join(scanned)}: {summary}")
+                else:
+                    print(f"ok: {summary}")
+        finally:
+            if not args.keep:
+                await cleanup(conn)
+            else:
+                await conn.rollback()
+
+    await engine.dispose()
+    print(f"\n{failures} queries scan a table of {args.min_rows}+ rows")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
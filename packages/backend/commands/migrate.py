@@ -0,0 +1,18 @@
+import asyncio
+import logging
+
+from core.db import engine, init_db
+
+# Create missing tables and apply pending schema migrations, e.g. before rolling out a new version.
+# The api does the same at startup.
+# usage: python -m commands.migrate (from packages/backend)
+
+
+async def main() -> None:
+    await init_db()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
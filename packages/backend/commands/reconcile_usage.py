@@ -0,0 +1,21 @@
+import asyncio
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from api.utils.usage import reconcile_usage
+from core.db import engine
+
+# Recompute every user's storage usage ledger from the asset table.
+# usage: python -m commands.reconcile_usage (from packages/backend)
+
+
+async def main() -> None:
+    async with AsyncSession(engine) as session:
+        count = await reconcile_usage(session)
+        await session.commit()
+    await engine.dispose()
+    print(f"Reconciled storage usage of {count} users")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,338 @@
+import argparse
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+
+import psycopg
+from PIL import Image
+from sqlalchemy import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from api.utils.image import AUTHOR_METADATA_KEY
+from api.utils.usage import reconcile_usage
+from core.db import engine, init_db
+from core.minio import minio_client
+from core.security import get_password_hash
+from core.settings import settings
+
+# Bulk dataset for benchmarks, written straight into the tables with COPY: users (all sharing one
+# precomputed password hash), a power-law follow graph, plants, their updates and assets, a placeholder
+# image in storage per asset, then the derived rows the api maintains (timeline entries of the feed
+# window, usage ledger) in a handful of set based statements.
+# The users are split into batches generated and copied by a pool of processes, each writing the objects
+# of its batch from a thread pool while it generates the next one. The same --seed produces the same
+# rows (ids included) whatever the number of workers: run it once per database.
+# Seeded users are named <tag><n> (default s<seed>u<n>) and can log in with --password.
+# usage: python -m commands.seed --users 1000000 --updates 50 (from packages/backend)
+
+_MASK = (1 << 64) - 1
+# odd: multiplying by it permutes the 64 bit integers, consecutive numbers get scattered ids
+_GOLDEN = 0x9E3779B97F4A7C15
+
+
+@dataclass(frozen=True)
+class Placeholder:
+    content: bytes
+    # etag minio computes for a single part upload, and sha256, hex
+    md5: str
+    sha256: str
+
+
+@dataclass(frozen=True)
+class SeedConfig:
+    seed: int
+    users: int
+    tag: str
+    password_hash: str
+    plants: float
+    updates: float
+    follows: float
+    follow_skew: float
+    pending: float
+    cuttings: float
+    days: float
+    now: float
+    placeholders: tuple[Placeholder, ...]
+    write_objects: bool
+    object_concurrency: int
+    # first 64 bits of the generated ids per kind of row, formatted (see id_prefix)
+    prefixes: dict[str, str]
+
+    def id(self, kind: str, n: int) -> str:
+        low = f"{(n * _GOLDEN) & _MASK:016x}"
+        return f"{self.prefixes[kind]}{low[:4]}-{low[4:]}"
+
+    def user_id(self, index: int) -> str:
+        return self.id("user", index)
+
+
+def id_prefix(high: int) -> str:
+    # canonical form: asset ids are also the object names
+    digits = f"{high:016x}"
+    return f"{digits[:8]}-{digits[8:12]}-{digits[12:]}-"
+
+
+_config: SeedConfig | None = None
+
+
+def _init_worker(config: SeedConfig) -> None:
+    global _config
+    _config = config
+
+
+def _connect() -> psycopg.Connection:
+    return psycopg.connect(
+        host=settings.POSTGRES_HOST,
+        port=settings.POSTGRES_PORT,
+        dbname=settings.POSTGRES_DB,
+        user=settings.POSTGRES_USER,
+        password=settings.POSTGRES_PASSWORD,
+    )
+
+
+def _copy(conn: psycopg.Connection, statement: str, rows: list[str]) -> None:
+    # text format: tab separated columns, \N for NULL; none of the generated values needs escaping
+    with conn.cursor().copy(statement) as copy:
+        for start in range(0, len(rows), 10_000):
+            copy.write("".join(rows[start:start + 10_000]))
+
+
+def _timestamp(epoch: float) -> str:
+    # timestamp without time zone, local time like the api's datetime.now()
+    return datetime.fromtimestamp(epoch).isoformat(" ")
+
+
+def _copy_users(bounds: tuple[int, int]) -> int:
+    config = _config
+    rows = [
+        f"{config.user_id(index)}\t{config.tag}{index}@seed.invalid\t{config.tag}{index}\t{config.password_hash}\n"
+        for index in range(*bounds)
+    ]
+    with _connect() as conn:
+        _copy(conn, 'COPY "user" (id, email, username, password_hash) FROM STDIN', rows)
+    return len(rows)
+
+
+def _follow_targets(config: SeedConfig, index: int, rng: random.Random) -> set[int]:
+    """
+    Out-degree drawn from a Pareto distribution (mean --follows), targets by popularity: user n is picked
+    with a probability decreasing as a power of n, a few users gather most of the followers.
+    """
+    # paretovariate(2) has a mean of 2
+    degree = min(round(config.follows / 2 * rng.paretovariate(2)), (config.users - 1) // 2)
+    targets: set[int] = set()
+    while len(targets) < degree:
+        target = int(config.users * rng.random() ** config.follow_skew)
+        if target != index:
+            targets.add(target)
+    return targets
+
+
+def _seed_batch(bounds: tuple[int, int]) -> Counter:
+    config = _config
+    counts: Counter = Counter()
+    assets: list[str] = []
+    plants: list[str] = []
+    updates: list[str] = []
+    follows: list[str] = []
+    # (object name, author, placeholder) to write to storage
+    objects: list[tuple[str, str, Placeholder]] = []
+
+    for index in range(*bounds):
+        # one generator per user: the rows do not depend on the batches or the workers
+        rng = random.Random(config.seed * 1_000_003 + index)
+        user_id = config.user_id(index)
+
+        plant_count = max(1, round(rng.expovariate(1 / config.plants)))
+        update_count = max(plant_count, round(rng.expovariate(1 / config.updates)))
+        plant_ids = [config.id("plant", index << 20 | plant) for plant in range(plant_count)]
+        asset_ids = [config.id("asset", index << 8 | image) for image in range(len(config.placeholders))]
+
+        # each plant gets at least one update, the others go to random plants
+        by_plant: list[list[tuple[float, int]]] = [[] for _ in range(plant_count)]
+        usage = Counter()
+        for number in range(update_count):
+            plant = number if number < plant_count else int(rng.random() * plant_count)
+            image = int(rng.random() * len(asset_ids))
+            usage[image] += 1
+            created_at = config.now - rng.random() * config.days * 86400
+            by_plant[plant].append((created_at, image))
+            updates.append(
+                f"{config.id('update', index << 24 | number)}\t{plant_ids[plant]}\t"
+                f"{_timestamp(created_at)}\t{asset_ids[image]}\n"
+            )
+
+        # one asset per distinct placeholder of the user, referenced by every update showing it
+        for image, refcount in usage.items():
+            asset_id = asset_ids[image]
+            placeholder = config.placeholders[image]
+            assets.append(
+                f"{asset_id}\t{user_id}\t{placeholder.md5}\t{len(placeholder.content)}\t{placeholder.sha256}\t"
+                f"{refcount}\tIMAGE_JPEG\tPRIVATE\n"
+            )
+            objects.append((asset_id, user_id, placeholder))
+
+        for plant, plant_updates in enumerate(by_plant):
+            created_at, _ = min(plant_updates)
+            updated_at, image = max(plant_updates)
+            # cuttings of the first plant
+            parent = plant_ids[0] if plant and rng.random() < config.cuttings else "\\N"
+            plants.append(
+                f"{plant_ids[plant]}\t{user_id}\tplant {plant}\t{_timestamp(created_at)}\t"
+                f"{_timestamp(updated_at)}\tf\t{asset_ids[image]}\t{parent}\n"
+            )
+
+        for target in _follow_targets(config, index, rng):
+            status = "PENDING" if rng.random() < config.pending else "APPROVED"
+            created_at = _timestamp(config.now - rng.random() * config.days * 86400)
+            follows.append(f"{user_id}\t{config.user_id(target)}\t{created_at}\t{status}\n")
+
+    with ThreadPoolExecutor(max_workers=config.object_concurrency) as executor:
+        # the objects are written while the rows are copied
+        puts = [
+            executor.submit(
+                minio_client.put_object,
+                bucket_name=settings.IMAGES_BUCKET,
+                object_name=object_name,
+                data=io.BytesIO(placeholder.content),
+                length=len(placeholder.content),
+                content_type="image/jpeg",
+                metadata={AUTHOR_METADATA_KEY: author},
+            )
+            for object_name, author, placeholder in (objects if config.write_objects else [])
+        ]
+
+        # in foreign key order, a transaction per batch
+        with _connect() as conn:
+            _copy(conn, "COPY asset (id, author, asset_etag, asset_size, content_hash, refcount, asset_type, "
+                        "asset_visibility) FROM STDIN", assets)
+            _copy(conn, "COPY plant (id, owner, name, created_at, updated_at, dead, asset_id, parent_id) FROM STDIN",
+                  plants)
+            _copy(conn, "COPY plantupdate (id, plant_id, created_at, asset_id) FROM STDIN", updates)
+            _copy(conn, "COPY follower (from_user, to_user, created_at, status) FROM STDIN", follows)
+
+    for put in puts:
+        put.result()
+
+    counts.update(assets=len(assets), plants=len(plants), updates=len(updates), follows=len(follows), objects=len(puts))
+    return counts
+
+
+FINALIZE = [
+    # what the api writes when an update is published: an entry per approved follower, for the feed window
+    """INSERT INTO timelineentry (user_id, update_id, created_at, author, asset_id)
+       SELECT f.from_user, u.id, u.created_at, p.owner, u.asset_id
+       FROM plantupdate AS u
+       JOIN plant AS p ON p.id = u.plant_id
+       JOIN "user" AS owner ON owner.id = p.owner AND owner.username LIKE :tag || '%'
+       JOIN follower AS f ON f.to_user = p.owner AND f.status = 'APPROVED'
+       WHERE u.created_at > localtimestamp - make_interval(hours => :hours)
+       ON CONFLICT DO NOTHING""",
+]
+
+
+def make_placeholders(count: int, size: int, rng: random.Random) -> tuple[Placeholder, ...]:
+    placeholders = []
+    for _ in range(count):
+        buffer = io.BytesIO()
+        Image.new("RGB", (size, size), tuple(rng.randrange(256) for _ in range(3))).save(buffer, format="JPEG")
+        content = buffer.getvalue()
+        placeholders.append(Placeholder(content, hashlib.md5(content).hexdigest(), hashlib.sha256(content).hexdigest()))
+    return tuple(placeholders)
+
+
+async def finalize(tag: str) -> None:
+    async with AsyncSession(engine) as session:
+        conn = await session.connection()
+        for statement in FINALIZE:
+            await conn.execute(text(statement), {"tag": tag, "hours": settings.FEED_WINDOW_HOURS})
+        await reconcile_usage(session)
+        await session.commit()
+
+    async with engine.connect() as conn:
+        await conn.execute(text("ANALYZE"))
+        await conn.commit()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="bulk dataset written with COPY")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--plants", type=float, default=3, help="mean plants per user")
+    parser.add_argument("--updates", type=float, default=50, help="mean updates per user")
+    parser.add_argument("--follows", type=float, default=20, help="mean users followed per user")
+    parser.add_argument("--follow-skew", type=float, default=3,
+                        help="popularity skew of the followed users (1: uniform, higher: a few celebrities)")
+    parser.add_argument("--pending", type=float, default=0.05, help="share of follow requests left pending")
+    parser.add_argument("--cuttings", type=float, default=0.1, help="share of plants which are cuttings")
+    parser.add_argument("--days", type=float, default=90, help="updates are spread over this many days")
+    parser.add_argument("--images", type=int, default=4, help="distinct placeholder images (at most 256)")
+    parser.add_argument("--image-size", type=int, default=256, help="placeholder width & height (pixels)")
+    parser.add_argument("--skip-objects", action="store_true", help="do not write the placeholders to storage")
+    parser.add_argument("--object-concurrency", type=int, default=settings.STORAGE_MAX_CONCURRENCY)
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tag", help="username prefix (default s<seed>u)")
+    parser.add_argument("--batch", type=int, default=5_000, help="users per batch")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    await init_db()
+
+    rng = random.Random(args.seed)
+    tag = args.tag or f"s{args.seed}u"
+    config = SeedConfig(
+        seed=args.seed,
+        users=args.users,
+        tag=tag,
+        # bcrypt once, not once per user
+        password_hash=get_password_hash(args.password),
+        plants=args.plants,
+        updates=args.updates,
+        follows=args.follows,
+        follow_skew=args.follow_skew,
+        pending=args.pending,
+        cuttings=args.cuttings,
+        days=args.days,
+        now=time.time(),
+        placeholders=make_placeholders(min(args.images, 256), args.image_size, rng),
+        write_objects=not args.skip_objects,
+        object_concurrency=args.object_concurrency,
+        prefixes={kind: id_prefix(rng.getrandbits(64)) for kind in ("user", "asset", "plant", "update")},
+    )
+    batches = [(start, min(start + args.batch, args.users)) for start in range(0, args.users, args.batch)]
+
+    # spawn like the other worker pools: the parent has an event loop and threads running
+    with ProcessPoolExecutor(
+            max_workers=args.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(config,),
+    ) as executor:
+        start = time.perf_counter()
+        # every user first: the follows of a batch point to users of the others
+        users = sum(executor.map(_copy_users, batches))
+        print(f"{users} users in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        counts = Counter()
+        for done, batch_counts in enumerate(executor.map(_seed_batch, batches), start=1):
+            counts.update(batch_counts)
+            if done % max(1, len(batches) // 10) == 0 or done == len(batches):
+                print(f"{done}/{len(batches)} batches, {dict(counts)} in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    await finalize(tag)
+    print(f"timeline, usage and statistics in {time.perf_counter() - start:.1f}s")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
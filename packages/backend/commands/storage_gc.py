@@ -0,0 +1,27 @@
+import argparse
+import asyncio
+import logging
+
+from api.utils.storage_gc import collect_garbage, log_report
+from core.db import engine
+from core.storage import storage
+
+# Remove the objects of the images bucket which have no asset row, and report the asset rows without object.
+# The api runs the same collection every STORAGE_GC_INTERVAL seconds.
+# usage: python -m commands.storage_gc [--dry-run] (from packages/backend)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="storage garbage collection")
+    parser.add_argument("--dry-run", action="store_true", help="only report, do not remove anything")
+    args = parser.parse_args()
+
+    report = await collect_garbage(storage, dry_run=args.dry_run)
+    log_report(report, dry_run=args.dry_run)
+    storage.close()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(main())
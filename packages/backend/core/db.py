@@ -1,7 +1,11 @@
-from sqlmodel import create_engine, SQLModel
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
 
+from core import metrics, query_budget
+from core.migrations import run_migrations
 from core.settings import settings
 from models import * # type: ignore
+from models.tables import * # type: ignore
 
 def get_engine_url() -> str:
     return "postgresql+psycopg://{username}:{password}@{host}:{port}/{db_name}".format(
@@ -12,12 +16,19 @@ def get_engine_url() -> str:
         db_name=settings.POSTGRES_DB,
     )
 
-engine = create_engine(
+# psycopg 3 speaks asyncio natively, the same url serves the async engine
+engine = create_async_engine(
     get_engine_url(),
     echo=False,  # Enable SQL query logging
     pool_pre_ping=True,  # Enable connection health checks
+    pool_size=settings.POSTGRES_POOL_SIZE,
+    max_overflow=settings.POSTGRES_MAX_OVERFLOW,
     connect_args={"connect_timeout": 5}  # Add connection timeout
 )
+metrics.register_pool("postgres", engine.sync_engine.pool)
+query_budget.instrument(engine)
 
-def init_db() -> None:
-    SQLModel.metadata.create_all(engine)
\ No newline at end of file
+async def init_db() -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    await run_migrations(engine)
@@ -0,0 +1,169 @@
+import asyncio
+import os
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from core import metrics
+from core.settings import settings
+
+# prefix of the files being filled, never served
+TEMP_PREFIX = ".fill-"
+
+
+class DiskCache:
+    """
+    Read-through cache of storage objects on local disk, bounded by total bytes with LRU eviction.
+
+    Keys are file names: they must change whenever the content does (e.g. contain the etag).
+    The part of a key before its first '.' is its group: all the entries of a group are dropped at once
+    by invalidate_group (e.g. every version and variant of an asset).
+    Files are downloaded to a temporary name then renamed, so a cached file is always complete.
+    The index lives in memory and is only meant to be used from the event loop thread (no locking),
+    it is rebuilt from the directory at startup.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        # key -> file size, least recently used first
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        # group -> its keys
+        self._groups: dict[str, set[str]] = {}
+        # concurrent misses on the same key share one download
+        self._pending: dict[str, asyncio.Task[tuple[Path, os.stat_result]]] = {}
+        self.size = 0
+        # counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def load(self) -> None:
+        """
+        Index the files left by a previous run, oldest first, and drop unfinished fills.
+        """
+        if not self.enabled:
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files: list[tuple[float, str, int]] = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.startswith(TEMP_PREFIX):
+                    os.unlink(entry.path)
+                    continue
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+
+        for _, key, size in sorted(files):
+            self._add(key, size)
+        self._evict()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key
+
+    @staticmethod
+    def _group(key: str) -> str:
+        return key.partition(".")[0]
+
+    def _add(self, key: str, size: int) -> None:
+        self.size += size - self._entries.get(key, 0)
+        self._entries[key] = size
+        self._entries.move_to_end(key)
+        self._groups.setdefault(self._group(key), set()).add(key)
+
+    def _discard(self, key: str) -> None:
+        size = self._entries.pop(key, None)
+        if size is None:
+            return
+        self.size -= size
+        group = self._group(key)
+        self._groups[group].discard(key)
+        if not self._groups[group]:
+            del self._groups[group]
+        self._path(key).unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        while self.size > self.max_bytes and self._entries:
+            self._discard(next(iter(self._entries)))
+            self.evictions += 1
+
+    def get(self, key: str) -> tuple[Path, os.stat_result] | None:
+        if key not in self._entries:
+            self.misses += 1
+            return None
+
+        path = self._path(key)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            # removed behind our back (e.g. by another worker sharing the directory)
+            self._discard(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return path, stat
+
+    async def fill(self, key: str, download: Callable[[Path], Awaitable[None]]) -> tuple[Path, os.stat_result]:
+        """
+        Download a missing entry with `download(temporary path)` and add it to the cache.
+        """
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fill(key, download))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        # a cancelled request must not cancel the download other requests are waiting on
+        return await asyncio.shield(task)
+
+    async def _fill(self, key: str, download: Callable[[Path], Awaitable[None]]) -> tuple[Path, os.stat_result]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temp_path = self._path(f"{TEMP_PREFIX}{uuid.uuid4().hex}")
+        path = self._path(key)
+        try:
+            await download(temp_path)
+            stat = temp_path.stat()
+            os.replace(temp_path, path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+
+        self._add(key, stat.st_size)
+        self._evict()
+        return path, stat
+
+    def invalidate_group(self, group: str) -> None:
+        for key in list(self._groups.get(group, ())):
+            self._discard(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "size": len(self._entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hit_ratio,
+        }
+
+
+asset_cache = DiskCache(
+    directory=settings.ASSET_CACHE_DIR,
+    max_bytes=settings.ASSET_CACHE_MAX_BYTES,
+)
+metrics.register_cache("asset_disk", asset_cache)
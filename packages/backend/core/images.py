@@ -0,0 +1,52 @@
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+from core.settings import settings
+
+
+class InvalidImageError(ValueError):
+    """
+    The data could not be decoded as an image.
+    """
+
+
+def resize_jpeg(data: bytes, width: int, quality: int) -> bytes:
+    """
+    Downscale a JPEG to the given width, keeping its aspect ratio. Images already narrower are returned as is.
+    Runs in a worker process: keep it a pure function of its arguments.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.width <= width:
+                return data
+
+            height = max(1, round(image.height * width / image.width))
+            resized = image.convert("RGB").resize((width, height), Image.Resampling.LANCZOS)
+    except (OSError, Image.DecompressionBombError) as e:
+        # pillow reports unknown formats and truncated data as OSError, nothing is read from disk here
+        raise InvalidImageError(str(e)) from None
+
+    output = io.BytesIO()
+    resized.save(output, format="JPEG", quality=quality, optimize=True)
+    return output.getvalue()
+
+
+# spawn: forking a process that runs an event loop and thread pools is unsafe
+_executor = ProcessPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS,
+    mp_context=multiprocessing.get_context("spawn"),
+)
+
+
+async def resize_image(data: bytes, width: int) -> bytes:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, resize_jpeg, data, width, settings.IMAGE_VARIANT_QUALITY)
+
+
+def shutdown() -> None:
+    _executor.shutdown(wait=False, cancel_futures=True)
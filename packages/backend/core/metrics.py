@@ -0,0 +1,145 @@
+import time
+from typing import Protocol
+
+from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+from prometheus_client.registry import Collector
+from sqlalchemy.pool import Pool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.settings import settings
+
+# Everything is kept in process (prometheus_client's default registry) and rendered on GET /metrics:
+# nothing is pushed, no collector has to run. Recording a sample is a dict lookup and a lock,
+# gauges (pool, caches) are only read when /metrics is scraped.
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request, until the end of the response body",
+    ["method", "route", "status"],
+)
+
+STORAGE_LATENCY = Histogram(
+    "storage_call_duration_seconds",
+    "Duration of a call to the object storage, once admitted (see core/storage.py)",
+    ["operation"],
+)
+STORAGE_BYTES = Counter(
+    "storage_bytes",
+    "Bytes sent to (put_object) and read from (get_object) the object storage",
+    ["operation"],
+)
+
+PASSWORD_LATENCY = Histogram(
+    "password_hash_duration_seconds",
+    "Time a worker spent in bcrypt, per operation (see core/passwords.py)",
+    ["operation"],
+    buckets=(.01, .025, .05, .1, .2, .3, .5, .75, 1.0, 2.5),
+)
+
+# requests which did not match a route share a label, the path is not used: it is unbounded
+UNMATCHED_ROUTE = "unmatched"
+
+
+def route_label(scope: Scope) -> str:
+    """
+    The template of the route the router matched, without the API_V1_STR prefix (e.g. /plants/{plant_id}):
+    one label per endpoint whatever the ids. The router stores the matched route in the scope.
+    """
+    route = scope.get("route")
+    if route is None:
+        return UNMATCHED_ROUTE
+    return route.path.removeprefix(settings.API_V1_STR)
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (no BaseHTTPMiddleware task and stream per request) timing every http request,
+    labelled with its route_label: one series per endpoint.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_LATENCY.labels(
+                scope["method"], route_label(scope), status_code,
+            ).observe(time.perf_counter() - start)
+
+
+class _CacheStats(Protocol):
+    hits: int
+    misses: int
+    hit_ratio: float
+
+    def __len__(self) -> int: ...
+
+
+class _CacheCollector(Collector):
+    def __init__(self):
+        self._caches: dict[str, _CacheStats] = {}
+
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Cache lookups which found a fresh entry", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache lookups which did not", labels=["cache"])
+        ratio = GaugeMetricFamily("cache_hit_ratio", "Hits over lookups since startup", labels=["cache"])
+        entries = GaugeMetricFamily("cache_entries", "Entries currently cached", labels=["cache"])
+        for name, cache in self._caches.items():
+            hits.add_metric([name], cache.hits)
+            misses.add_metric([name], cache.misses)
+            ratio.add_metric([name], cache.hit_ratio)
+            entries.add_metric([name], len(cache))
+        yield from (hits, misses, ratio, entries)
+
+
+class _PoolCollector(Collector):
+    def __init__(self):
+        self._pools: dict[str, Pool] = {}
+
+    def collect(self):
+        checked_out = GaugeMetricFamily("db_pool_checked_out", "Connections in use", labels=["pool"])
+        overflow = GaugeMetricFamily(
+            "db_pool_overflow", "Connections open beyond pool_size (negative: not all opened yet)", labels=["pool"],
+        )
+        size = GaugeMetricFamily("db_pool_size", "Configured pool_size", labels=["pool"])
+        for name, pool in self._pools.items():
+            # QueuePool counters, read without locking
+            checked_out.add_metric([name], pool.checkedout())
+            overflow.add_metric([name], pool.overflow())
+            size.add_metric([name], pool.size())
+        yield from (checked_out, overflow, size)
+
+
+_cache_collector = _CacheCollector()
+_pool_collector = _PoolCollector()
+REGISTRY.register(_cache_collector)
+REGISTRY.register(_pool_collector)
+
+
+def register_cache(name: str, cache: _CacheStats) -> None:
+    _cache_collector._caches[name] = cache
+
+
+def register_pool(name: str, pool: Pool) -> None:
+    _pool_collector._pools[name] = pool
+
+
+def render() -> tuple[bytes, str]:
+    # body and content type of the exposition
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,146 @@
+import logging
+from dataclasses import dataclass
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from sqlmodel import insert, select
+
+from models.tables.schema_migration import SchemaMigration
+
+logger = logging.getLogger('uvicorn.error')
+
+# any constant: replicas starting together apply the migrations one after the other
+MIGRATION_LOCK_ID = 7_142_027
+
+# Tables are created by SQLModel.metadata.create_all from the models, which only creates what is missing.
+# Every later change of the schema of an existing table goes here, and in the model for new databases.
+#
+# Steps run one by one in autocommit mode, as CREATE INDEX CONCURRENTLY (which does not block writes)
+# cannot run in a transaction. A migration is recorded once all its steps succeeded, so steps must be
+# idempotent: an interrupted migration is applied again at the next startup.
+
+
+@dataclass(frozen=True)
+class CreateIndex:
+    name: str
+    # e.g. 'ON plant (owner, created_at, id)'
+    definition: str
+    unique: bool = False
+
+
+@dataclass(frozen=True)
+class DropIndex:
+    name: str
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    steps: list[str | CreateIndex | DropIndex]
+    # skipped, and retried at the next startup, while this extension is not available on the server
+    extension: str | None = None
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "user search: prefix index", [
+        CreateIndex("ix_user_username_pattern", '''ON "user" (username varchar_pattern_ops)'''),
+    ]),
+    Migration(2, "user search: trigram index", [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        CreateIndex("ix_user_username_trgm", '''ON "user" USING gin (username gin_trgm_ops)'''),
+    ], extension="pg_trgm"),
+    Migration(3, "plant updates: newest first per plant", [
+        CreateIndex("ix_plantupdate_plant_id_created_at_id", "ON plantupdate (plant_id, created_at, id)"),
+        DropIndex("ix_plantupdate_plant_id"),
+    ]),
+    Migration(4, "plants: newest first per owner", [
+        CreateIndex("ix_plant_owner_created_at_id", "ON plant (owner, created_at, id)"),
+    ]),
+    Migration(5, "cuttings: newest first per parent", [
+        CreateIndex("ix_plant_parent_id_created_at_id", "ON plant (parent_id, created_at, id)"),
+    ]),
+    Migration(6, "followers: by followee and status", [
+        CreateIndex("ix_follower_to_user_status", "ON follower (to_user, status)"),
+        DropIndex("ix_follower_to_user"),
+    ]),
+    Migration(7, "assets: by author", [
+        CreateIndex("ix_asset_author", "ON asset (author)"),
+    ]),
+    Migration(8, "timeline: by author, for the cascade when deleting a user", [
+        CreateIndex("ix_timelineentry_author", "ON timelineentry (author)"),
+    ]),
+    Migration(9, "references to assets, checked when deleting an asset", [
+        CreateIndex("ix_plantupdate_asset_id", "ON plantupdate (asset_id)"),
+        CreateIndex("ix_plant_asset_id", "ON plant (asset_id)"),
+        CreateIndex("ix_user_avatar_asset_id", '''ON "user" (avatar_asset_id)'''),
+    ]),
+    Migration(10, "assets: content hash", [
+        "ALTER TABLE asset ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    ]),
+    Migration(11, "assets: deduplication by content, reference count", [
+        "ALTER TABLE asset ADD COLUMN IF NOT EXISTS refcount INTEGER NOT NULL DEFAULT 1",
+        # duplicates uploaded before: only the first one takes part in the deduplication
+        """UPDATE asset SET content_hash = NULL WHERE id IN (
+               SELECT id FROM (
+                   SELECT id, row_number() OVER (PARTITION BY author, asset_visibility, content_hash ORDER BY id) AS n
+                   FROM asset WHERE content_hash IS NOT NULL
+               ) AS duplicate WHERE n > 1
+           )""",
+        CreateIndex("ux_asset_author_visibility_content_hash", "ON asset (author, asset_visibility, content_hash)",
+                    unique=True),
+    ]),
+]
+
+
+async def _index_is_valid(conn: AsyncConnection, name: str) -> bool | None:
+    # None when the index does not exist
+    return (await conn.execute(
+        text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+        {"name": name},
+    )).scalar()
+
+
+async def _apply(conn: AsyncConnection, step: str | CreateIndex | DropIndex) -> None:
+    match step:
+        case CreateIndex(name=name, definition=definition, unique=unique):
+            # an interrupted concurrent build leaves an invalid index behind, which IF NOT EXISTS would keep
+            if await _index_is_valid(conn, name) is False:
+                await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            await conn.execute(text(f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}"))
+        case DropIndex(name=name):
+            await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        case _:
+            await conn.execute(text(step))
+
+
+async def _extension_available(conn: AsyncConnection, extension: str) -> bool:
+    return (await conn.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = :name)"),
+        {"name": extension},
+    )).scalar()
+
+
+async def run_migrations(engine: AsyncEngine) -> None:
+    """
+    Apply the migrations this database has not seen yet, in version order.
+    """
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        try:
+            applied = set((await conn.execute(select(SchemaMigration.version))).scalars().all())
+            for migration in MIGRATIONS:
+                if migration.version in applied:
+                    continue
+                if migration.extension is not None and not await _extension_available(conn, migration.extension):
+                    logger.warning(f"Skipping migration {migration.version} ({migration.name}): "
+                                   f"extension {migration.extension} is not available")
+                    continue
+
+                logger.info(f"Applying migration {migration.version} ({migration.name})")
+                for step in migration.steps:
+                    await _apply(conn, step)
+                await conn.execute(insert(SchemaMigration).values(version=migration.version, name=migration.name))
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
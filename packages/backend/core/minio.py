@@ -1,4 +1,9 @@
+import os
+
+import certifi
+import urllib3
 from minio import Minio
+from urllib3 import Retry
 
 from core.settings import settings
 
@@ -7,6 +12,28 @@ minio_client = Minio(
     access_key=settings.MINIO_ROOT_USER,
     secret_key=settings.MINIO_ROOT_PASSWORD,
     secure=settings.MINIO_SECURE,
+    region=settings.MINIO_REGION,
+    # one pooled connection per concurrent storage call (see core/storage.py)
+    http_client=urllib3.PoolManager(
+        timeout=urllib3.Timeout(connect=5, read=settings.STORAGE_TIMEOUT),
+        maxsize=settings.STORAGE_MAX_CONCURRENCY,
+        ca_certs=os.environ.get('SSL_CERT_FILE') or certifi.where(),
+        retries=Retry(
+            total=5,
+            backoff_factor=0.2,
+            status_forcelist=[500, 502, 503, 504]
+        ),
+    ),
+)
+
+# signs presigned urls for the endpoint clients can reach. Signing is local:
+# with the region set, no request is made to minio.
+presign_client = minio_client if settings.MINIO_PUBLIC_ENDPOINT is None else Minio(
+    settings.MINIO_PUBLIC_ENDPOINT,
+    access_key=settings.MINIO_ROOT_USER,
+    secret_key=settings.MINIO_ROOT_PASSWORD,
+    secure=settings.MINIO_PUBLIC_SECURE,
+    region=settings.MINIO_REGION,
 )
 
 def init_buckets() -> None:
@@ -0,0 +1,64 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, TypeVar
+
+from core import security
+from core.metrics import PASSWORD_LATENCY
+from core.settings import settings
+
+T = TypeVar("T")
+
+
+class PasswordPoolFull(Exception):
+    """
+    Too many password checks are already waiting for a worker: refused instead of queued (see main.py).
+    """
+
+
+# bcrypt holds the GIL and takes tens of milliseconds by design: off the event loop, and off the process
+# spawn: forking a process that runs an event loop and thread pools is unsafe
+# niced: when the cores are busy, serving the other requests comes before hashing passwords
+_executor = ProcessPoolExecutor(
+    max_workers=settings.PASSWORD_WORKERS,
+    mp_context=multiprocessing.get_context("spawn"),
+    initializer=os.nice,
+    initargs=(10,),
+)
+# admission: the ones running plus the ones queued
+_semaphore = asyncio.Semaphore(settings.PASSWORD_WORKERS + settings.PASSWORD_QUEUE_SIZE)
+
+
+def _timed(func: Callable[..., T], *args) -> tuple[float, T]:
+    # runs in the worker: only the time spent hashing, not the wait for a worker
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+async def _run(operation: str, func: Callable[..., T], *args) -> T:
+    # fail fast rather than letting a login storm queue up requests (and their connections)
+    if _semaphore.locked():
+        raise PasswordPoolFull()
+    async with _semaphore:
+        loop = asyncio.get_running_loop()
+        elapsed, result = await loop.run_in_executor(_executor, _timed, func, *args)
+    PASSWORD_LATENCY.labels(operation).observe(elapsed)
+    return result
+
+
+async def hash_password(password: str) -> str:
+    return await _run("hash", security.get_password_hash, password)
+
+
+async def verify_password(password: str, password_hash: str) -> tuple[bool, str | None]:
+    """
+    Returns whether the password matches, and a new hash if the stored one uses an outdated cost factor.
+    """
+    return await _run("verify", security.verify_password, password, password_hash)
+
+
+def shutdown() -> None:
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,17 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+
+logger = logging.getLogger('uvicorn.error')
+
+
+async def run_periodically(interval: float, job: Callable[[], Awaitable[None]]) -> None:
+    """
+    Run job every interval seconds until cancelled. A failing run is logged and retried on the next tick.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await job()
+        except Exception:
+            logger.exception(f"periodic job {job.__name__} failed")
@@ -0,0 +1,108 @@
+import logging
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.metrics import route_label
+from core.settings import settings
+
+logger = logging.getLogger('uvicorn.error')
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    # time spent in the database driver, seconds
+    duration: float = 0.0
+
+
+# the counters every statement of the current context is added to: the request's, and any
+# assert_max_queries block around it. Set per request (a context is copied by each task it starts,
+# background tasks included), and visible from the engine events: sqlalchemy runs them in the caller's context
+_active: ContextVar[tuple[QueryStats, ...]] = ContextVar("query_stats", default=())
+
+_START_KEY = "query_budget_start"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info[_START_KEY] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    elapsed = time.perf_counter() - conn.info.pop(_START_KEY, time.perf_counter())
+    for stats in _active.get():
+        stats.count += 1
+        stats.duration += elapsed
+
+
+def instrument(engine: AsyncEngine) -> None:
+    # statements are counted at the cursor: one per round trip, whatever the orm does
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """
+    Count the statements executed within the block (in this context and the tasks it starts).
+    """
+    stats = QueryStats()
+    token = _active.set(_active.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _active.reset(token)
+
+
+@contextmanager
+def assert_max_queries(max_queries: int, label: str = "") -> Iterator[QueryStats]:
+    """
+    Fail (AssertionError) when the block executes more than max_queries statements, e.g. around an
+    in-process request to catch a regression of an endpoint's query count (see benchmarks/query_budget.py).
+    """
+    with track_queries() as stats:
+        yield stats
+    assert stats.count <= max_queries, f"{label or 'block'}: {stats.count} queries, at most {max_queries} expected"
+
+
+class QueryBudgetMiddleware:
+    """
+    Count the statements of every http request: reported in a Server-Timing header (the ones run before
+    the response starts), and logged when the request goes over SQL_QUERY_BUDGET or SQL_TIME_BUDGET.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing", f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"',
+                )
+            await send(message)
+
+        with track_queries() as stats:
+            await self.app(scope, receive, send_wrapper)
+
+        over_count = 0 < settings.SQL_QUERY_BUDGET < stats.count
+        over_time = 0 < settings.SQL_TIME_BUDGET < stats.duration
+        if over_count or over_time:
+            # the route template groups the requests of an endpoint, see core/metrics.py
+            logger.warning(
+                "%s %s (%s): %d queries, %.1fms in the database",
+                scope["method"], scope["path"], route_label(scope), stats.count,
+                stats.duration * 1000,
+            )
@@ -1,5 +1,7 @@
+import os
 import secrets
-from typing import Annotated, List
+import tempfile
+from typing import Annotated, List, Literal
 
 from pydantic import field_validator
 from pydantic_settings import BaseSettings, NoDecode
@@ -19,6 +21,9 @@ class Settings(BaseSettings):
     POSTGRES_DB: str = "testDB"
     POSTGRES_USER: str = "testUser"
     POSTGRES_PASSWORD: str = "testPassword"
+    # connection pool of the async engine
+    POSTGRES_POOL_SIZE: int = 10
+    POSTGRES_MAX_OVERFLOW: int = 20
 
     # minio credentials
     MINIO_HOST: str = "localhost"
@@ -26,14 +31,73 @@ class Settings(BaseSettings):
     MINIO_ROOT_USER: str = "admin"
     MINIO_ROOT_PASSWORD: str = "Password1234"
     MINIO_SECURE: bool = False
+    MINIO_REGION: str = "us-east-1"
+    # host:port of minio as reachable by clients, for presigned urls (defaults to MINIO_HOST:MINIO_PORT)
+    MINIO_PUBLIC_ENDPOINT: str | None = None
+    MINIO_PUBLIC_SECURE: bool = False
+
+    # object storage calls: max in-flight calls, per-call timeout (seconds), download chunk size
+    STORAGE_MAX_CONCURRENCY: int = 16
+    STORAGE_TIMEOUT: float = 30.0
+    STORAGE_CHUNK_SIZE: int = 64 * 1024
+    # seconds an upload waits for the next chunk of the client's body (the whole upload is not bounded)
+    STORAGE_UPLOAD_IDLE_TIMEOUT: float = 30.0
 
     # prevent unauthorized access
     RESTRICT_HOSTS: bool = False
     TRUSTED_HOSTS: Annotated[List[str], NoDecode] = []
 
+    # authentication caches: verified tokens & user rows (entries, seconds)
+    TOKEN_CACHE_SIZE: int = 10_000
+    TOKEN_CACHE_TTL: int = 60 * 60
+    USER_CACHE_SIZE: int = 10_000
+    USER_CACHE_TTL: int = 60
+
+    # bcrypt cost factor, existing hashes are upgraded (or downgraded) at the next login
+    BCRYPT_ROUNDS: int = 12
+    # processes hashing passwords, and password checks allowed to wait for one before answering 503
+    PASSWORD_WORKERS: int = 2
+    PASSWORD_QUEUE_SIZE: int = 8
+
+    # requests running more statements, or spending more seconds in the database, are logged (0 disables)
+    SQL_QUERY_BUDGET: int = 15
+    SQL_TIME_BUDGET: float = 0.1
+
     # asset configuration
     MAX_IMAGE_SIZE: int = 1 * 1024 * 1024  # 1MB
     MAX_SUM_STORAGE: int = MAX_IMAGE_SIZE * 100 # 100MB
+    # POST /updates/batch: images per request, and images of a request uploaded to storage at once
+    UPDATE_BATCH_MAX_ITEMS: int = 20
+    UPDATE_BATCH_CONCURRENCY: int = 4
+    # how assets are delivered: streamed through the api, or through a presigned minio url
+    # returned as a redirect or as json
+    ASSET_DELIVERY: Literal["stream", "redirect", "json"] = "stream"
+    # validity of presigned urls (seconds)
+    PRESIGNED_URL_TTL: int = 10 * 60
+    # Cache-Control max-age (seconds) of public assets, and of private (follower only) ones
+    PUBLIC_ASSET_MAX_AGE: int = 60 * 60 * 24 * 365
+    PRIVATE_ASSET_MAX_AGE: int = 60 * 60 * 24
+    # processes resizing images & JPEG quality of the resized variants
+    IMAGE_WORKERS: int = 2
+    IMAGE_VARIANT_QUALITY: int = 85
+    # local disk cache of streamed assets, bounded in bytes: opt-in, disabled by 0
+    # (e.g. 536870912 for 512MB, on a disk of its own rather than the shared temp directory)
+    ASSET_CACHE_DIR: str = os.path.join(tempfile.gettempdir(), "boycott-assets")
+    ASSET_CACHE_MAX_BYTES: int = 0
+
+    # list endpoints (plants, updates, cuttings, feed) write their rows straight to JSON with orjson
+    # instead of building and validating a response model per item, see api/utils/fast_json.py
+    FAST_JSON_RESPONSES: bool = False
+
+    # how far back the feed looks
+    FEED_WINDOW_HOURS: int = 24
+    # seconds between two purges of timeline entries older than the feed window
+    TIMELINE_PRUNE_INTERVAL: int = 60 * 60
+
+    # seconds between two storage garbage collections (0 disables the in-app job)
+    STORAGE_GC_INTERVAL: int = 60 * 60 * 24
+    # objects younger than this (seconds) are never collected: their asset row may not be committed yet
+    STORAGE_GC_MIN_AGE: int = 60 * 60
 
     @field_validator('TRUSTED_HOSTS', mode='before')
     @classmethod
@@ -0,0 +1,312 @@
+import asyncio
+import io
+import itertools
+import os
+import time
+from collections.abc import AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+from typing import Any, BinaryIO, Callable, TypeVar
+
+from minio import Minio
+from minio.datatypes import Object, Part
+from minio.deleteobjects import DeleteError, DeleteObject
+from minio.helpers import MIN_PART_SIZE, ObjectWriteResult, genheaders
+from urllib3 import BaseHTTPResponse
+
+from core.metrics import STORAGE_BYTES, STORAGE_LATENCY
+from core.minio import minio_client, presign_client
+from core.settings import settings
+
+T = TypeVar("T")
+
+
+class UploadTimeoutError(TimeoutError):
+    """
+    The client stopped sending its body: no chunk arrived within STORAGE_UPLOAD_IDLE_TIMEOUT.
+    """
+
+
+class UploadLengthError(ValueError):
+    """
+    The body of an upload is not as long as declared.
+    """
+
+
+class _PartReader:
+    """
+    Buffers an async iterator of chunks into parts, on the event loop: the client is read outside of
+    the storage slots, only the upload of a complete part is admitted (see AsyncStorage.put_stream).
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes], idle_timeout: float):
+        self._chunks = chunks
+        self._idle_timeout = idle_timeout
+        self._buffer = bytearray()
+        self._done = False
+        self.received = 0
+
+    async def read_part(self, size: int) -> tuple[bytes, bool]:
+        """
+        Up to size bytes, and whether more follow them.
+        """
+        # one byte past the part tells whether it is the last one
+        while len(self._buffer) <= size and not self._done:
+            try:
+                # exceptions of the iterator (e.g. a size limit) are raised here, before anything is uploaded
+                chunk = await asyncio.wait_for(anext(self._chunks, None), timeout=self._idle_timeout)
+            except TimeoutError:
+                raise UploadTimeoutError() from None
+            if chunk is None:
+                self._done = True
+            else:
+                self._buffer += chunk
+                self.received += len(chunk)
+        part = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return part, bool(self._buffer)
+
+
+class AsyncStorage:
+    """
+    Non-blocking facade over the (blocking) minio client.
+
+    Every call runs on a bounded thread pool, is admitted through a semaphore
+    capping the number of in-flight storage calls, and is bounded by a timeout.
+    """
+
+    def __init__(self, client: Minio, presign_client: Minio, bucket_name: str, max_concurrency: int, timeout: float):
+        self._client = client
+        self._presign_client = presign_client
+        self._bucket_name = bucket_name
+        self._timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="storage")
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _run(self, operation: str, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            # timed once admitted: the wait for a slot is not the storage's latency
+            start = time.perf_counter()
+            try:
+                return await asyncio.wait_for(
+                    loop.run_in_executor(self._executor, partial(func, *args, **kwargs)),
+                    timeout=self._timeout,
+                )
+            finally:
+                STORAGE_LATENCY.labels(operation).observe(time.perf_counter() - start)
+
+    async def put_object(
+            self,
+            object_name: str,
+            data: BinaryIO,
+            length: int,
+            content_type: str,
+            metadata: dict[str, Any] | None = None,
+    ) -> ObjectWriteResult:
+        result = await self._run(
+            "put_object",
+            self._client.put_object,
+            bucket_name=self._bucket_name,
+            object_name=object_name,
+            data=data,
+            length=length,
+            content_type=content_type,
+            metadata=metadata,
+        )
+        STORAGE_BYTES.labels("put_object").inc(length)
+        return result
+
+    async def put_stream(
+            self,
+            object_name: str,
+            chunks: AsyncIterator[bytes],
+            content_type: str,
+            length: int | None = None,
+            metadata: dict[str, Any] | None = None,
+    ) -> ObjectWriteResult:
+        """
+        Upload chunks as they arrive, the length (optional) is checked once they are all read. Everything
+        fitting in a part is a single put, bigger uploads are sent part by part (multipart upload).
+        The chunks are buffered on the event loop, at most one part per upload and nothing goes to disk:
+        a slow client holds no storage slot, and is only bounded by STORAGE_UPLOAD_IDLE_TIMEOUT between
+        two chunks. Each call to minio is admitted and bounded by STORAGE_TIMEOUT as usual.
+        """
+        reader = _PartReader(chunks, settings.STORAGE_UPLOAD_IDLE_TIMEOUT)
+
+        def check_length() -> None:
+            if length is not None and reader.received != length:
+                raise UploadLengthError(f"expected {length} bytes, got {reader.received}")
+
+        try:
+            part, more = await reader.read_part(MIN_PART_SIZE)
+            if not more:
+                check_length()
+                return await self._run(
+                    "put_object",
+                    self._client.put_object,
+                    bucket_name=self._bucket_name,
+                    object_name=object_name,
+                    data=io.BytesIO(part),
+                    length=len(part),
+                    content_type=content_type,
+                    metadata=metadata,
+                )
+            return await self._put_parts(object_name, reader, part, content_type, metadata, check_length)
+        finally:
+            STORAGE_BYTES.labels("put_object").inc(reader.received)
+
+    async def _put_parts(
+            self,
+            object_name: str,
+            reader: _PartReader,
+            part: bytes,
+            content_type: str,
+            metadata: dict[str, Any] | None,
+            check_length: Callable[[], None],
+    ) -> ObjectWriteResult:
+        # the steps of minio's put_object for an unknown length, each run (and admitted) on its own
+        headers = genheaders(metadata, None, None, None, False)
+        headers["Content-Type"] = content_type
+        upload_id = await self._run(
+            "create_multipart_upload", self._client._create_multipart_upload, self._bucket_name, object_name, headers,
+        )
+        try:
+            parts: list[Part] = []
+            more = True
+            while more:
+                if parts:
+                    part, more = await reader.read_part(MIN_PART_SIZE)
+                etag = await self._run(
+                    "upload_part", self._client._upload_part,
+                    self._bucket_name, object_name, part, None, upload_id, len(parts) + 1,
+                )
+                parts.append(Part(len(parts) + 1, etag))
+            check_length()
+            result = await self._run(
+                "complete_multipart_upload", self._client._complete_multipart_upload,
+                self._bucket_name, object_name, upload_id, parts,
+            )
+        except BaseException:
+            # also when cancelled: the parts uploaded so far are dropped by the storage, not left pending
+            await asyncio.shield(self._run(
+                "abort_multipart_upload", self._client._abort_multipart_upload,
+                self._bucket_name, object_name, upload_id,
+            ))
+            raise
+        return ObjectWriteResult(
+            result.bucket_name,
+            result.object_name,
+            result.version_id,
+            result.etag,
+            result.http_headers,
+            location=result.location,
+        )
+
+    async def get_object(self, object_name: str, offset: int = 0, length: int = 0) -> BaseHTTPResponse:
+        # length=0 reads up to the end of the object
+        return await self._run(
+            "get_object",
+            self._client.get_object,
+            bucket_name=self._bucket_name,
+            object_name=object_name,
+            offset=offset,
+            length=length,
+        )
+
+    async def read_object(self, object_name: str) -> bytes:
+        response = await self.get_object(object_name)
+        try:
+            data = await self._run("read_object", response.read)
+            STORAGE_BYTES.labels("get_object").inc(len(data))
+            return data
+        finally:
+            response.close()
+            response.release_conn()
+
+    async def download_object(self, object_name: str, file_path: str | os.PathLike[str]) -> None:
+        def download() -> int:
+            response = self._client.get_object(bucket_name=self._bucket_name, object_name=object_name)
+            try:
+                with open(file_path, "wb") as file:
+                    for chunk in response.stream(settings.STORAGE_CHUNK_SIZE):
+                        file.write(chunk)
+                    return file.tell()
+            finally:
+                response.close()
+                response.release_conn()
+
+        STORAGE_BYTES.labels("get_object").inc(await self._run("download_object", download))
+
+    async def stat_object(self, object_name: str) -> Object:
+        return await self._run(
+            "stat_object",
+            self._client.stat_object,
+            bucket_name=self._bucket_name,
+            object_name=object_name,
+        )
+
+    async def iter_response(self, response: BaseHTTPResponse) -> AsyncIterator[bytes]:
+        # each chunk is read off-loop, the slot is released between chunks so slow clients do not hog the pool
+        try:
+            while chunk := await self._run("read_chunk", response.read, settings.STORAGE_CHUNK_SIZE):
+                STORAGE_BYTES.labels("get_object").inc(len(chunk))
+                yield chunk
+        finally:
+            response.close()
+            response.release_conn()
+
+    async def list_objects(self, page_size: int = 1000) -> AsyncIterator[Object]:
+        """
+        Every object of the bucket, in key order. The listing is paginated by minio, pages are pulled off-loop.
+        """
+        objects = self._client.list_objects(bucket_name=self._bucket_name, recursive=True)
+
+        def next_page() -> list[Object]:
+            return list(itertools.islice(objects, page_size))
+
+        while page := await self._run("list_objects", next_page):
+            for obj in page:
+                yield obj
+
+    async def remove_object(self, object_name: str) -> None:
+        await self._run(
+            "remove_object",
+            self._client.remove_object,
+            bucket_name=self._bucket_name,
+            object_name=object_name,
+        )
+
+    def presigned_get_object(self, object_name: str, expires: timedelta) -> str:
+        # pure computation (region is configured): no need to leave the event loop
+        return self._presign_client.presigned_get_object(
+            bucket_name=self._bucket_name,
+            object_name=object_name,
+            expires=expires,
+        )
+
+    async def remove_objects(self, object_names: list[str]) -> list[DeleteError]:
+        """
+        Delete several objects with a single request, returns the per object errors.
+        """
+        def remove() -> list[DeleteError]:
+            # remove_objects is lazy: the errors iterator has to be consumed for the request to happen
+            return list(self._client.remove_objects(
+                bucket_name=self._bucket_name,
+                delete_object_list=[DeleteObject(name) for name in object_names],
+            ))
+
+        return await self._run("remove_objects", remove)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+storage = AsyncStorage(
+    client=minio_client,
+    presign_client=presign_client,
+    bucket_name=settings.IMAGES_BUCKET,
+    max_concurrency=settings.STORAGE_MAX_CONCURRENCY,
+    timeout=settings.STORAGE_TIMEOUT,
+)
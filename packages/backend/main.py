@@ -1,24 +1,65 @@
+import asyncio
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from starlette import status
+from starlette.responses import JSONResponse, Response
 
 from api.main import api_router
+from api.utils.follow_graph import load_follow_graph
+from api.utils.storage_gc import run_storage_gc
+from api.utils.timeline import prune_expired_timeline
+from core import images, metrics, passwords, query_budget
+from core.disk_cache import asset_cache
 from core.minio import init_buckets
+from core.periodic import run_periodically
+from core.storage import storage
 from core.settings import settings
 from core.db import init_db
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI):
-    init_db()
+    await init_db()
     init_buckets()
+    await load_follow_graph()
+    asset_cache.load()
+    tasks = [
+        asyncio.create_task(run_periodically(settings.TIMELINE_PRUNE_INTERVAL, prune_expired_timeline)),
+    ]
+    if settings.STORAGE_GC_INTERVAL > 0:
+        tasks.append(asyncio.create_task(run_periodically(settings.STORAGE_GC_INTERVAL, run_storage_gc)))
     yield
+    for task in tasks:
+        task.cancel()
+    storage.close()
+    images.shutdown()
+    passwords.shutdown()
 
 app = FastAPI(lifespan=lifespan)
 
+@app.exception_handler(passwords.PasswordPoolFull)
+async def password_pool_full_handler(_request: Request, _exc: passwords.PasswordPoolFull) -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Too many login attempts in progress, retry later"},
+        headers={"Retry-After": "1"},
+    )
+
 if settings.RESTRICT_HOSTS:
     app.add_middleware(
         TrustedHostMiddleware, allowed_hosts=settings.TRUSTED_HOSTS,
     )
 
-app.include_router(api_router, prefix=settings.API_V1_STR)
\ No newline at end of file
+app.add_middleware(query_budget.QueryBudgetMiddleware)
+
+# outermost: times the whole request, including the other middlewares
+app.add_middleware(metrics.MetricsMiddleware)
+
+app.include_router(api_router, prefix=settings.API_V1_STR)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    # Prometheus text exposition of this process, see core/metrics.py
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
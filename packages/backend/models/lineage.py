@@ -0,0 +1,19 @@
+import uuid
+
+from pydantic import BaseModel
+
+class LineageNode(BaseModel):
+    id: uuid.UUID
+    # edge of the tree: None for the oldest ancestor
+    parent_id: uuid.UUID | None
+    owner: uuid.UUID
+    name: str
+    asset_id: uuid.UUID | None
+    dead: bool
+    # generations from the requested plant: negative for ancestors, positive for descendants
+    depth: int
+
+class Lineage(BaseModel):
+    plant_id: uuid.UUID
+    # adjacency list, ancestors first then descendants by depth
+    nodes: list[LineageNode]
@@ -0,0 +1,7 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+
+class PresignedUrl(BaseModel):
+    url: str
+    expires_at: datetime
@@ -1,7 +1,7 @@
 import uuid
 from enum import Enum
 
-from sqlalchemy import Column
+from sqlalchemy import Column, Index
 
 from sqlmodel import Field, SQLModel, Enum as DBEnum
 
@@ -13,12 +13,22 @@ class AssetVisibility(str, Enum):
     PRIVATE = "private"
 
 class Asset(SQLModel, table=True):
+    __table_args__ = (
+        # identical bytes uploaded by a user, with the same visibility, are stored once (see api/utils/assets.py)
+        Index("ux_asset_author_visibility_content_hash", "author", "asset_visibility", "content_hash", unique=True),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
 
-    author: uuid.UUID = Field(foreign_key="user.id")
+    # indexed for the usage aggregate
+    author: uuid.UUID = Field(foreign_key="user.id", index=True)
 
     # etag is computed by Minio
     asset_etag: str = Field(max_length=64, min_length=64)
     asset_size: int = Field()
+    # sha256 of the content, hex, computed while uploading
+    content_hash: str | None = Field(default=None, max_length=64)
+    # uploads using this asset: plant updates and avatars, the row and the object go when it reaches 0
+    refcount: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
     asset_type: AssetType = Field(sa_column=Column(DBEnum(AssetType)))
     asset_visibility: AssetVisibility = Field(default=AssetVisibility.PRIVATE, sa_column=Column(DBEnum(AssetVisibility)))
\ No newline at end of file
@@ -2,7 +2,7 @@ import uuid
 from datetime import datetime
 from enum import Enum
 
-from sqlalchemy import Column
+from sqlalchemy import Column, Index
 from sqlmodel import SQLModel, Field, Enum as DBEnum
 
 class FollowStatus(str, Enum):
@@ -12,7 +12,12 @@ class FollowStatus(str, Enum):
 
 
 class Follower(SQLModel, table=True):
+    __table_args__ = (
+        # followers of a user, by status (pending requests)
+        Index("ix_follower_to_user_status", "to_user", "status"),
+    )
+
     from_user: uuid.UUID = Field(foreign_key="user.id", primary_key=True, index=True)
-    to_user: uuid.UUID = Field(foreign_key="user.id", primary_key=True, index=True)
+    to_user: uuid.UUID = Field(foreign_key="user.id", primary_key=True)
     created_at: datetime = Field(default_factory=datetime.now)
     status: FollowStatus = Field(default=FollowStatus.PENDING, sa_column=Column(DBEnum(FollowStatus)))
\ No newline at end of file
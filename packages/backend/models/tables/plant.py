@@ -1,10 +1,16 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime
+from sqlalchemy import Column, DateTime, Index
 from sqlmodel import Field, SQLModel
 
 class Plant(SQLModel, table=True):
+    __table_args__ = (
+        # plants of a user, and cuttings of a plant, are read newest first by (created_at, id)
+        Index("ix_plant_owner_created_at_id", "owner", "created_at", "id"),
+        Index("ix_plant_parent_id_created_at_id", "parent_id", "created_at", "id"),
+    )
+
     id: uuid.UUID = Field(
         default_factory=uuid.uuid4,
         primary_key=True,
@@ -21,6 +27,6 @@ class Plant(SQLModel, table=True):
     dead: bool = Field(default=False)
 
     # latest asset id
-    asset_id: uuid.UUID | None = Field(default=None, foreign_key="asset.id")
+    asset_id: uuid.UUID | None = Field(default=None, foreign_key="asset.id", index=True)
     # parent plant id
     parent_id: uuid.UUID | None = Field(default=None, foreign_key="plant.id")
@@ -1,16 +1,23 @@
 import uuid
 from datetime import datetime
 
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
 class PlantUpdate(SQLModel, table=True):
+    __table_args__ = (
+        # updates of a plant are read newest first by (created_at, id)
+        Index("ix_plantupdate_plant_id_created_at_id", "plant_id", "created_at", "id"),
+    )
+
     id: uuid.UUID = Field(
         default_factory=uuid.uuid4,
         primary_key=True,
     )
-    plant_id: uuid.UUID = Field(foreign_key="plant.id", index=True)
+    plant_id: uuid.UUID = Field(foreign_key="plant.id")
     created_at: datetime = Field(default_factory=datetime.now)
 
-    asset_id: uuid.UUID = Field(foreign_key="asset.id")
+    # indexed for the foreign key check when deleting an asset
+    asset_id: uuid.UUID = Field(foreign_key="asset.id", index=True)
 
@@ -0,0 +1,9 @@
+from datetime import datetime
+
+from sqlmodel import Field, SQLModel
+
+# Schema migrations already applied to this database (see core/migrations.py)
+class SchemaMigration(SQLModel, table=True):
+    version: int = Field(primary_key=True)
+    name: str = Field(max_length=128)
+    applied_at: datetime = Field(default_factory=datetime.now)
@@ -0,0 +1,22 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+# Materialized home timeline: one row per (follower, plant update), written when the update is published
+class TimelineEntry(SQLModel, table=True):
+    __table_args__ = (
+        # feed pages are read newest first by (created_at, update_id)
+        Index("ix_timelineentry_user_id_created_at_update_id", "user_id", "created_at", "update_id"),
+    )
+
+    # owner of the timeline
+    user_id: uuid.UUID = Field(foreign_key="user.id", primary_key=True, ondelete="CASCADE")
+    # removing a plant update prunes it from every timeline (indexed for the cascade)
+    update_id: uuid.UUID = Field(foreign_key="plantupdate.id", primary_key=True, index=True, ondelete="CASCADE")
+
+    # copied from the plant update so the feed reads a single index range
+    created_at: datetime = Field()
+    author: uuid.UUID = Field(foreign_key="user.id", index=True, ondelete="CASCADE")
+    asset_id: uuid.UUID = Field()
@@ -1,12 +1,18 @@
 import uuid
 
 from pydantic import EmailStr
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 class User(SQLModel, table=True):
+    __table_args__ = (
+        # prefix search (LIKE 'x%'), see api/utils/search.py
+        Index("ix_user_username_pattern", "username", postgresql_ops={"username": "varchar_pattern_ops"}),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     email: EmailStr = Field(unique=True, index=True, max_length=255)
     username: str = Field(unique=True, max_length=64)
     password_hash: str = Field(max_length=255)
     # user avatar
-    avatar_asset_id: uuid.UUID | None = Field(default=None, foreign_key="asset.id")
\ No newline at end of file
+    avatar_asset_id: uuid.UUID | None = Field(default=None, foreign_key="asset.id", index=True)
\ No newline at end of file
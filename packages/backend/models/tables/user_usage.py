@@ -0,0 +1,8 @@
+import uuid
+
+from sqlmodel import Field, SQLModel
+
+# Denormalized storage usage, maintained alongside asset inserts & deletes (see api/utils/usage.py)
+class UserUsage(SQLModel, table=True):
+    user_id: uuid.UUID = Field(foreign_key="user.id", primary_key=True)
+    asset_size_sum: int = Field(default=0)
@@ -0,0 +1,17 @@
+import uuid
+
+from pydantic import BaseModel
+
+from models.tables.plant_update import PlantUpdate
+
+class BatchUpdateResult(BaseModel):
+    # position of the image in the request
+    index: int
+    plant_id: uuid.UUID
+    # what publishing this image alone would have answered
+    status_code: int
+    update: PlantUpdate | None = None
+    detail: str | None = None
+
+class BatchUpdateResponse(BaseModel):
+    items: list[BatchUpdateResult]
@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+import httpx
+
+# Measures the CPU time the api process spends per image served.
+# Start the api with ASSET_DELIVERY=stream, run this script, then again with ASSET_DELIVERY=redirect.
+# The api must run on this machine: its CPU time is read from /proc/<pid>/stat (Linux only).
+
+
+def process_cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as stat:
+        # fields after the command name, which may contain spaces
+        fields = stat.read().rsplit(")", 1)[1].split()
+    # utime & stime, in clock ticks
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def setup(client: httpx.AsyncClient, image: bytes) -> tuple[dict[str, str], str]:
+    username = f"bench{uuid.uuid4().hex[:12]}"
+    response = await client.post("/users/create", json={
+        "email": f"{username}@example.com",
+        "username": username,
+        "password": "password",
+    })
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['token']['access_token']}"}
+
+    response = await client.post(
+        "/plants/",
+        headers=headers,
+        data={"name": "bench"},
+        files={"image": ("bench.jpg", image, "image/jpeg")},
+    )
+    response.raise_for_status()
+    return headers, response.json()["asset_id"]
+
+
+async def fetch(client: httpx.AsyncClient, headers: dict[str, str], asset_id: str, count: int) -> int:
+    received = 0
+    for _ in range(count):
+        # redirects are followed: the bytes then come from minio, not from the api
+        response = await client.get(f"/assets/{asset_id}", headers=headers)
+        response.raise_for_status()
+        received += len(response.content)
+    return received
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="api CPU time per image served")
+    parser.add_argument("base_url", help="host:port of a running instance")
+    parser.add_argument("--pid", type=int, required=True, help="pid of the api process")
+    parser.add_argument("--image", required=True, help="path to a JPEG to upload and fetch")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    with open(args.image, "rb") as f:
+        image = f.read()
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(
+            base_url=f"http://{args.base_url}/api/v1", limits=limits, timeout=60, follow_redirects=True,
+    ) as client:
+        headers, asset_id = await setup(client, image)
+
+        per_worker = args.requests // args.concurrency
+        cpu_before = process_cpu_seconds(args.pid)
+        start = time.perf_counter()
+        received = sum(await asyncio.gather(
+            *[fetch(client, headers, asset_id, per_worker) for _ in range(args.concurrency)]
+        ))
+        elapsed = time.perf_counter() - start
+        cpu = process_cpu_seconds(args.pid) - cpu_before
+
+    served = per_worker * args.concurrency
+    print(f"images served:     {served} ({received / served / 1024:.1f} KiB each)")
+    print(f"throughput:        {served / elapsed:.1f} images/s")
+    print(f"api CPU per image: {cpu / served * 1e6:.0f} µs")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
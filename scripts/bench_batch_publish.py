@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+import httpx
+
+# Wall time to publish a week of photos: one POST /updates/{plant_id} per image, one after the other,
+# against a single POST /updates/batch. Every image is new (random bytes), none is deduplicated.
+
+
+async def setup(client: httpx.AsyncClient, size: int) -> tuple[dict[str, str], str]:
+    username = f"bench{uuid.uuid4().hex[:12]}"
+    response = await client.post("/users/create", json={
+        "email": f"{username}@example.com",
+        "username": username,
+        "password": "password",
+    })
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['token']['access_token']}"}
+
+    response = await client.post(
+        "/plants/",
+        headers=headers,
+        data={"name": "bench"},
+        files={"image": ("bench.jpg", os.urandom(size), "image/jpeg")},
+    )
+    response.raise_for_status()
+    return headers, response.json()["id"]
+
+
+async def one_by_one(client: httpx.AsyncClient, headers: dict[str, str], plant_id: str, images: list[bytes]) -> None:
+    for image in images:
+        response = await client.post(
+            f"/updates/{plant_id}", headers=headers, files={"image": ("bench.jpg", image, "image/jpeg")},
+        )
+        response.raise_for_status()
+
+
+async def batch(client: httpx.AsyncClient, headers: dict[str, str], plant_id: str, images: list[bytes]) -> None:
+    response = await client.post(
+        "/updates/batch",
+        headers=headers,
+        data={"plant_ids": [plant_id] * len(images)},
+        files=[("images", (f"{index}.jpg", image, "image/jpeg")) for index, image in enumerate(images)],
+    )
+    response.raise_for_status()
+    failed = [item for item in response.json()["items"] if item["status_code"] != 200]
+    if failed:
+        raise RuntimeError(f"batch items failed: {failed}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="sequential single uploads vs one batch request")
+    parser.add_argument("base_url", help="host:port of a running instance")
+    parser.add_argument("--images", type=int, default=7)
+    parser.add_argument("--size", type=int, default=1000 * 1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=f"http://{args.base_url}/api/v1", timeout=60) as client:
+        headers, plant_id = await setup(client, args.size)
+        for label, publish in (("one request per image", one_by_one), ("one batch request", batch)):
+            samples: list[float] = []
+            for _ in range(args.repeat):
+                images = [os.urandom(args.size) for _ in range(args.images)]
+                start = time.perf_counter()
+                await publish(client, headers, plant_id, images)
+                samples.append((time.perf_counter() - start) * 1000)
+            print(f"{label:<24} {args.images} images: median={sorted(samples)[len(samples) // 2]:9.2f}ms "
+                  f"min={min(samples):9.2f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import os
+import statistics
+import time
+import uuid
+
+import httpx
+
+# Time and quota used by plant updates whose image the user already stored, against new images.
+# Duplicates reference the stored asset: nothing is charged, and with a Repr-Digest header the
+# body is not even read (the client may then send an empty one).
+
+
+async def setup(client: httpx.AsyncClient, image: bytes) -> tuple[dict[str, str], str]:
+    username = f"bench{uuid.uuid4().hex[:12]}"
+    response = await client.post("/users/create", json={
+        "email": f"{username}@example.com",
+        "username": username,
+        "password": "password",
+    })
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['token']['access_token']}"}
+
+    response = await client.post(
+        "/plants/",
+        headers=headers,
+        data={"name": "bench"},
+        files={"image": ("bench.jpg", image, "image/jpeg")},
+    )
+    response.raise_for_status()
+    return headers, response.json()["id"]
+
+
+async def usage(client: httpx.AsyncClient, headers: dict[str, str]) -> int:
+    response = await client.get("/users/usage", headers=headers)
+    response.raise_for_status()
+    return response.json()["asset_size_sum"]
+
+
+async def publish(client: httpx.AsyncClient, headers: dict[str, str], plant_id: str, image: bytes, mode: str) -> None:
+    if mode == "multipart":
+        response = await client.post(
+            f"/updates/{plant_id}", headers=headers, files={"image": ("bench.jpg", image, "image/jpeg")},
+        )
+    else:
+        digest = base64.b64encode(hashlib.sha256(image).digest()).decode()
+        response = await client.post(
+            f"/updates/{plant_id}/stream",
+            headers={**headers, "Content-Type": "image/jpeg", "Repr-Digest": f"sha-256=:{digest}:"},
+            content=image,
+        )
+    response.raise_for_status()
+
+
+async def measure(client, headers, plant_id, images: list[bytes], mode: str, label: str) -> None:
+    before = await usage(client, headers)
+    samples: list[float] = []
+    for image in images:
+        start = time.perf_counter()
+        await publish(client, headers, plant_id, image, mode)
+        samples.append((time.perf_counter() - start) * 1000)
+    charged = await usage(client, headers) - before
+    print(f"{label:<24} {mode:<10} median={statistics.median(samples):8.2f}ms quota used={charged} bytes")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="upload time and quota of new vs duplicate images")
+    parser.add_argument("base_url", help="host:port of a running instance")
+    parser.add_argument("--uploads", type=int, default=20)
+    parser.add_argument("--size", type=int, default=1000 * 1000)
+    args = parser.parse_args()
+
+    duplicate = os.urandom(args.size)
+    async with httpx.AsyncClient(base_url=f"http://{args.base_url}/api/v1", timeout=60) as client:
+        headers, plant_id = await setup(client, duplicate)
+        for mode in ("multipart", "stream"):
+            await measure(client, headers, plant_id,
+                          [os.urandom(args.size) for _ in range(args.uploads)], mode, "new images")
+            await measure(client, headers, plant_id, [duplicate] * args.uploads, mode, "duplicates")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
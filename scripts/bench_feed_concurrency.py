@@ -0,0 +1,82 @@
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+# percentile is shared with the backend benchmarks (packages/backend/benchmarks/stats.py)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "packages" / "backend"))
+from benchmarks.stats import percentile  # noqa: E402
+
+# Measures /users/me latency alone, then while /feed/ queries hammer the same process.
+# With a blocking database layer the second p99 explodes, with the async one it stays flat.
+
+
+async def create_user(client: httpx.AsyncClient) -> dict[str, str]:
+    username = f"bench{uuid.uuid4().hex[:12]}"
+    response = await client.post("/users/create", json={
+        "email": f"{username}@example.com",
+        "username": username,
+        "password": "password",
+    })
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['token']['access_token']}"}
+
+
+async def sample_me(client: httpx.AsyncClient, headers: dict[str, str], duration: float) -> list[float]:
+    samples: list[float] = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.get("/users/me", headers=headers)
+        response.raise_for_status()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def hammer_feed(client: httpx.AsyncClient, headers: dict[str, str], stop: asyncio.Event) -> int:
+    count = 0
+    while not stop.is_set():
+        response = await client.get("/feed/", headers=headers)
+        response.raise_for_status()
+        count += 1
+    return count
+
+
+def report(label: str, samples: list[float]) -> None:
+    print(f"{label:<12} n={len(samples):<6} "
+          f"p50={statistics.median(samples):7.2f}ms "
+          f"p95={percentile(samples, 95):7.2f}ms "
+          f"p99={percentile(samples, 99):7.2f}ms")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="p99 of /users/me with and without concurrent /feed/ load")
+    parser.add_argument("base_url", help="host:port of a running instance")
+    parser.add_argument("--feed-workers", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.feed_workers + 4)
+    async with httpx.AsyncClient(base_url=f"http://{args.base_url}/api/v1", limits=limits, timeout=60) as client:
+        headers = await create_user(client)
+
+        idle = await sample_me(client, headers, args.duration)
+
+        stop = asyncio.Event()
+        feeders = [asyncio.create_task(hammer_feed(client, headers, stop)) for _ in range(args.feed_workers)]
+        loaded = await sample_me(client, headers, args.duration)
+        stop.set()
+        feed_requests = sum(await asyncio.gather(*feeders))
+
+    report("idle", idle)
+    report("feed load", loaded)
+    print(f"/feed/ requests served during load: {feed_requests} ({feed_requests / args.duration:.1f} req/s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+# percentile is shared with the backend benchmarks (packages/backend/benchmarks/stats.py)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "packages" / "backend"))
+from benchmarks.stats import percentile  # noqa: E402
+
+# Measures /feed/ latency alone, then during a storm of logins on the same process.
+# With bcrypt on the event loop every login freezes all requests for its whole hash;
+# with the password worker pool the feed stays flat and the excess logins get a fast 503.
+
+
+async def create_user(client: httpx.AsyncClient) -> tuple[str, dict[str, str]]:
+    username = f"bench{uuid.uuid4().hex[:12]}"
+    response = await client.post("/users/create", json={
+        "email": f"{username}@example.com",
+        "username": username,
+        "password": "password",
+    })
+    response.raise_for_status()
+    return username, {"Authorization": f"Bearer {response.json()['token']['access_token']}"}
+
+
+async def sample_feed(client: httpx.AsyncClient, headers: dict[str, str], duration: float) -> list[float]:
+    samples: list[float] = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.get("/feed/", headers=headers)
+        response.raise_for_status()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def storm(client: httpx.AsyncClient, username: str, stop: asyncio.Event, statuses: Counter, latencies: list[float]) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.post("/users/login", json={"username": username, "password": "password"})
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses[response.status_code] += 1
+        # refused logins back off as asked, like a well behaved client
+        if response.status_code == 503:
+            await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+
+
+def report(label: str, samples: list[float]) -> None:
+    print(f"{label:<14} n={len(samples):<6} "
+          f"p50={statistics.median(samples):8.2f}ms "
+          f"p95={percentile(samples, 95):8.2f}ms "
+          f"p99={percentile(samples, 99):8.2f}ms")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="/feed/ latency with and without a concurrent login storm")
+    parser.add_argument("base_url", help="host:port of a running instance")
+    parser.add_argument("--login-workers", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.login_workers + 4)
+    async with httpx.AsyncClient(base_url=f"http://{args.base_url}/api/v1", limits=limits, timeout=60) as client:
+        username, headers = await create_user(client)
+
+        idle = await sample_feed(client, headers, args.duration)
+
+        stop = asyncio.Event()
+        statuses: Counter = Counter()
+        login_latencies: list[float] = []
+        stormers = [
+            asyncio.create_task(storm(client, username, stop, statuses, login_latencies))
+            for _ in range(args.login_workers)
+        ]
+        loaded = await sample_feed(client, headers, args.duration)
+        stop.set()
+        await asyncio.gather(*stormers)
+
+    report("feed idle", idle)
+    report("feed + logins", loaded)
+    report("logins", login_latencies)
+    print("login statuses: " + ", ".join(f"{code}: {count}" for code, count in sorted(statuses.items())))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+import httpx
+
+# Peak memory of the api process while many uploads are in flight, multipart form vs streamed body.
+# Clients send slowly, so that all the uploads overlap: starlette spools every multipart body before
+# the route runs, while a streamed body is only read once a storage slot is free.
+# The api must run on this machine: its memory is read from /proc/<pid>/status (Linux only).
+
+
+def resident_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    raise RuntimeError("no VmRSS")
+
+
+async def create_user(client: httpx.AsyncClient) -> dict[str, str]:
+    username = f"bench{uuid.uuid4().hex[:12]}"
+    response = await client.post("/users/create", json={
+        "email": f"{username}@example.com",
+        "username": username,
+        "password": "password",
+    })
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['token']['access_token']}"}
+
+
+async def slow_body(data: bytes, chunk_size: int, delay: float):
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+        await asyncio.sleep(delay)
+
+
+async def upload(client: httpx.AsyncClient, headers: dict[str, str], data: bytes, mode: str, args) -> None:
+    # avatars replace each other: the quota does not run out however many rounds are made
+    if mode == "stream":
+        response = await client.post(
+            "/avatars/avatar/stream",
+            headers={**headers, "Content-Type": "image/jpeg"},
+            content=slow_body(data, args.chunk_size, args.delay),
+        )
+    else:
+        # httpx cannot stream a multipart file from an async generator: the body is sent at once
+        response = await client.post(
+            "/avatars/avatar",
+            headers=headers,
+            files={"image": ("bench.jpg", data, "image/jpeg")},
+        )
+    response.raise_for_status()
+
+
+async def sample_peak(pid: int, stop: asyncio.Event) -> int:
+    peak = 0
+    while not stop.is_set():
+        peak = max(peak, resident_bytes(pid))
+        await asyncio.sleep(0.01)
+    return peak
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="api memory with concurrent uploads, multipart vs streamed")
+    parser.add_argument("base_url", help="host:port of a running instance")
+    parser.add_argument("--pid", type=int, required=True, help="pid of the api process")
+    parser.add_argument("--mode", choices=["multipart", "stream"], required=True)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--size", type=int, default=1000 * 1000)
+    parser.add_argument("--chunk-size", type=int, default=64 * 1024)
+    parser.add_argument("--delay", type=float, default=0.05, help="seconds between two chunks of a streamed body")
+    args = parser.parse_args()
+
+    data = os.urandom(args.size)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=f"http://{args.base_url}/api/v1", limits=limits, timeout=120) as client:
+        # one user per uploader, created one by one (password hashing is admission controlled)
+        users = [await create_user(client) for _ in range(args.concurrency)]
+
+        baseline = resident_bytes(args.pid)
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_peak(args.pid, stop))
+
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            await asyncio.gather(*(upload(client, headers, data, args.mode, args) for headers in users))
+        elapsed = time.perf_counter() - start
+
+        stop.set()
+        peak = await sampler
+
+    uploads = args.concurrency * args.rounds
+    print(f"{args.mode}: {uploads} uploads of {args.size} bytes in {elapsed:.2f}s, "
+          f"resident memory {baseline / 2**20:.1f}MiB -> peak {peak / 2**20:.1f}MiB "
+          f"(+{(peak - baseline) / 2**20:.1f}MiB)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
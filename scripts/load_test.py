@@ -0,0 +1,334 @@
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+# percentile is shared with the backend benchmarks (packages/backend/benchmarks/stats.py)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "packages" / "backend"))
+from benchmarks.stats import percentile  # noqa: E402
+
+# Replays weighted scenarios against a running instance (and the postgres & minio it uses), with a fixed
+# number of virtual users each running one scenario after the other, then reports the throughput and
+# the p50/p95/p99 latency of every endpoint. Results can be written to JSON (--json) and compared
+# to a previous run (--baseline).
+# Every user created is tagged with the run id, use a scratch database. Start the server with a low
+# BCRYPT_ROUNDS unless logins are what is measured.
+# usage: python scripts/load_test.py localhost:8000 --users 50 --concurrency 20 --duration 60 --json run.json
+
+# scenario -> weight, overridable with --weight name=value
+WEIGHTS: dict[str, int] = {
+    "browse_feed": 40,
+    "fetch_assets": 20,
+    "post_update": 10,
+    "search": 10,
+    "follow_approve": 10,
+    "signup_login": 5,
+}
+
+IMAGE_SIZE = 50 * 1000
+# signups tried per user of the setup before giving up on it
+SIGNUP_ATTEMPTS = 3
+
+
+@dataclass
+class User:
+    username: str
+    id: str
+    headers: dict[str, str]
+    plant_id: str | None = None
+    # ids of the users followed (or asked to)
+    following: set[str] = field(default_factory=set)
+
+
+class Recorder:
+    """
+    Latency and status of every request, per endpoint (method and route template, not the url).
+    """
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.statuses: dict[str, Counter] = defaultdict(Counter)
+        self.scenarios: Counter = Counter()
+        # off while the users are set up
+        self.enabled = False
+        # the last request which did not get a response, for the setup's errors
+        self.last_error: str | None = None
+
+    async def request(self, client: httpx.AsyncClient, endpoint: str, method: str, url: str, **kwargs) -> httpx.Response | None:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            if self.enabled:
+                self.statuses[endpoint][type(e).__name__] += 1
+            return None
+        if self.enabled:
+            self.latencies[endpoint].append((time.perf_counter() - start) * 1000)
+            self.statuses[endpoint][str(response.status_code)] += 1
+        # refused logins back off as asked, like a well behaved client
+        if response.status_code == 503:
+            await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+        return response
+
+    def summary(self, duration: float) -> dict[str, dict]:
+        endpoints = {}
+        for endpoint in sorted(self.statuses):
+            samples = self.latencies[endpoint]
+            statuses = self.statuses[endpoint]
+            count = sum(statuses.values())
+            endpoints[endpoint] = {
+                "count": count,
+                "errors": sum(n for status, n in statuses.items() if not status.isdigit() or int(status) >= 400),
+                "statuses": dict(statuses),
+                "rps": count / duration,
+                "mean_ms": statistics.fmean(samples) if samples else None,
+                "p50_ms": percentile(samples, 50) if samples else None,
+                "p95_ms": percentile(samples, 95) if samples else None,
+                "p99_ms": percentile(samples, 99) if samples else None,
+                "max_ms": max(samples) if samples else None,
+            }
+        return endpoints
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, run_id: str):
+        self.client = client
+        self.recorder = recorder
+        self.run_id = run_id
+        self.users: list[User] = []
+        # why the last signup failed
+        self.signup_error: str | None = None
+
+    async def request(self, endpoint: str, method: str, url: str, **kwargs) -> httpx.Response | None:
+        return await self.recorder.request(self.client, endpoint, method, url, **kwargs)
+
+    async def signup(self, rng: random.Random) -> User | None:
+        username = f"load{self.run_id}{rng.getrandbits(40):x}"
+        response = await self.request("POST /users/create", "POST", "/users/create", json={
+            "email": f"{username}@example.com",
+            "username": username,
+            "password": "password",
+        })
+        if response is None or response.status_code != 200:
+            self.signup_error = self.recorder.last_error if response is None else (
+                f"{response.status_code} {' '.join(response.text.split())[:200]}"
+            )
+            return None
+        body = response.json()
+        return User(username, body["user_id"], {"Authorization": f"Bearer {body['token']['access_token']}"})
+
+    async def create_plant(self, user: User, rng: random.Random) -> None:
+        response = await self.request(
+            "POST /plants/", "POST", "/plants/", headers=user.headers, data={"name": "plant"},
+            files={"image": ("plant.jpg", rng.randbytes(IMAGE_SIZE), "image/jpeg")},
+        )
+        if response is not None and response.status_code == 200:
+            user.plant_id = response.json()["id"]
+
+    async def follow(self, follower: User, followed: User) -> None:
+        response = await self.request("POST /followings/request/{user_id}", "POST",
+                                      f"/followings/request/{followed.id}", headers=follower.headers)
+        if response is None or response.status_code != 200:
+            return
+        follower.following.add(followed.id)
+        pending = await self.request("GET /followers/pending", "GET", "/followers/pending", headers=followed.headers)
+        if pending is not None and pending.status_code == 200:
+            for user in pending.json():
+                await self.request("POST /followers/{user_id}/approve", "POST", f"/followers/{user['id']}/approve",
+                                   headers=followed.headers)
+
+    async def setup(self, users: int, follows: int, rng: random.Random) -> None:
+        """
+        Users with a plant each, every one following up to `follows` others (approved). A user whose
+        signup fails SIGNUP_ATTEMPTS times is left out, the run is aborted when none could be created.
+        """
+        semaphore = asyncio.Semaphore(8)
+
+        async def create(seed: int) -> User | None:
+            user_rng = random.Random(seed)
+            async with semaphore:
+                for _ in range(SIGNUP_ATTEMPTS):
+                    user = await self.signup(user_rng)
+                    if user is not None:
+                        await self.create_plant(user, user_rng)
+                        return user
+                return None
+
+        # in creation order whatever the completion order: the same seed replays the same run
+        created = await asyncio.gather(*(create(rng.getrandbits(64)) for _ in range(users)))
+        self.users = [user for user in created if user is not None]
+        if len(self.users) < users:
+            print(f"setup: {users - len(self.users)} of {users} signups failed, last error: {self.signup_error}")
+        if not self.users:
+            sys.exit("setup: no user could be created")
+
+        async def follow_some(follower: User, seed: int) -> None:
+            user_rng = random.Random(seed)
+            async with semaphore:
+                others = [user for user in self.users if user is not follower]
+                for followed in user_rng.sample(others, min(follows, len(others))):
+                    await self.follow(follower, followed)
+
+        await asyncio.gather(*(follow_some(user, rng.getrandbits(64)) for user in self.users))
+
+    # scenarios: one virtual user's sequence of requests
+
+    async def signup_login(self, user: User, rng: random.Random) -> None:
+        new_user = await self.signup(rng)
+        if new_user is None:
+            return
+        await self.request("POST /users/login", "POST", "/users/login",
+                           json={"username": new_user.username, "password": "password"})
+        await self.request("GET /users/me", "GET", "/users/me", headers=new_user.headers)
+
+    async def browse_feed(self, user: User, rng: random.Random) -> None:
+        # the first page, the assets of a few of its items, sometimes the next page
+        response = await self.request("GET /feed/", "GET", "/feed/", headers=user.headers)
+        if response is None or response.status_code != 200:
+            return
+        page = response.json()
+        for item in page["items"][:3]:
+            await self.fetch_asset(user, item["asset_id"])
+        if page["next_cursor"] and rng.random() < 0.3:
+            await self.request("GET /feed/", "GET", "/feed/", headers=user.headers,
+                               params={"cursor": page["next_cursor"]})
+
+    async def fetch_asset(self, user: User, asset_id: str) -> None:
+        await self.request("GET /assets/{asset_id}", "GET", f"/assets/{asset_id}", headers=user.headers)
+
+    async def fetch_assets(self, user: User, rng: random.Random) -> None:
+        # the plants of someone followed (the others are not allowed), and their pictures
+        if not user.following:
+            return
+        other_id = rng.choice(sorted(user.following))
+        response = await self.request("GET /plants/", "GET", "/plants/", headers=user.headers,
+                                      params={"user_id": other_id})
+        if response is None or response.status_code != 200:
+            return
+        for plant in response.json()["items"][:3]:
+            if plant["asset_id"] is not None:
+                await self.fetch_asset(user, plant["asset_id"])
+
+    async def post_update(self, user: User, rng: random.Random) -> None:
+        if user.plant_id is None:
+            return await self.create_plant(user, rng)
+        await self.request("POST /updates/{plant_id}", "POST", f"/updates/{user.plant_id}", headers=user.headers,
+                           files={"image": ("update.jpg", rng.randbytes(IMAGE_SIZE), "image/jpeg")})
+        await self.request("GET /updates/{plant_id}", "GET", f"/updates/{user.plant_id}", headers=user.headers)
+
+    async def search(self, user: User, rng: random.Random) -> None:
+        # a fragment of a username: every user of the run matches the prefix
+        other = rng.choice(self.users)
+        start = rng.randrange(0, len(other.username) - 5)
+        await self.request("GET /users/search", "GET", "/users/search", headers=user.headers,
+                           params={"pattern": other.username[start:start + 5]})
+
+    async def follow_approve(self, user: User, rng: random.Random) -> None:
+        others = [other for other in self.users if other is not user and other.id not in user.following]
+        if others:
+            await self.follow(user, rng.choice(others))
+
+    async def virtual_user(self, weights: dict[str, int], deadline: float, think: float, seed: int) -> None:
+        rng = random.Random(seed)
+        names = list(weights)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights=[weights[name] for name in names])[0]
+            self.recorder.scenarios[name] += 1
+            await getattr(self, name)(rng.choice(self.users), rng)
+            if think:
+                await asyncio.sleep(rng.expovariate(1 / think))
+
+
+def print_report(endpoints: dict[str, dict], baseline: dict[str, dict] | None) -> None:
+    print(f"{'endpoint':<36} {'count':>7} {'err':>5} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for endpoint, stats in endpoints.items():
+        if stats["p50_ms"] is None:
+            print(f"{endpoint:<36} {stats['count']:7d} {stats['errors']:5d}")
+            continue
+        line = (f"{endpoint:<36} {stats['count']:7d} {stats['errors']:5d} {stats['rps']:8.1f} "
+                f"{stats['p50_ms']:7.1f}ms {stats['p95_ms']:7.1f}ms {stats['p99_ms']:7.1f}ms")
+        previous = (baseline or {}).get(endpoint)
+        if previous and previous["p95_ms"]:
+            line += f"  p95 {(stats['p95_ms'] / previous['p95_ms'] - 1) * 100:+6.1f}%"
+            line += f" req/s {(stats['rps'] / previous['rps'] - 1) * 100:+6.1f}%"
+        print(line)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="weighted scenarios against a running instance, latency per endpoint")
+    parser.add_argument("base_url", help="host:port of a running instance")
+    parser.add_argument("--users", type=int, default=50, help="users created before the run")
+    parser.add_argument("--follows", type=int, default=5, help="users each of them follows")
+    parser.add_argument("--concurrency", type=int, default=20, help="virtual users running at once")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--think", type=float, default=0, help="mean pause between two scenarios (seconds)")
+    parser.add_argument("--weight", action="append", default=[], metavar="SCENARIO=WEIGHT")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results of a previous run (--json) to compare with")
+    args = parser.parse_args()
+
+    weights = dict(WEIGHTS)
+    for override in args.weight:
+        name, _, value = override.partition("=")
+        if name not in weights:
+            parser.error(f"unknown scenario {name}, expected one of {', '.join(weights)}")
+        weights[name] = int(value)
+
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    # the seed replays the same choices, the usernames are new every run
+    run_id = uuid.uuid4().hex[:6]
+    limits = httpx.Limits(max_connections=args.concurrency + 8)
+    async with httpx.AsyncClient(base_url=f"http://{args.base_url}/api/v1", timeout=60, limits=limits) as client:
+        load_test = LoadTest(client, recorder, run_id)
+        start = time.perf_counter()
+        await load_test.setup(args.users, args.follows, rng)
+        print(f"setup: {len(load_test.users)} users in {time.perf_counter() - start:.1f}s")
+
+        recorder.enabled = True
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(
+            load_test.virtual_user(weights, deadline, args.think, rng.getrandbits(64))
+            for _ in range(args.concurrency)
+        ))
+        duration = time.perf_counter() - start
+
+    endpoints = recorder.summary(duration)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["endpoints"]
+
+    total = sum(stats["count"] for stats in endpoints.values())
+    print(f"{total} requests in {duration:.1f}s: {total / duration:.1f} req/s, "
+          f"scenarios {dict(recorder.scenarios.most_common())}")
+    print_report(endpoints, baseline)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({
+                "date": datetime.now(timezone.utc).isoformat(),
+                "config": {**vars(args), "weights": weights},
+                "duration": duration,
+                "requests": total,
+                "rps": total / duration,
+                "scenarios": dict(recorder.scenarios),
+                "endpoints": endpoints,
+            }, file, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())